@@ -2,8 +2,11 @@
 # isort: off
 import os
 import asyncio
+import argparse
 import platform
+import multiprocessing
 
+from typing import List
 from loguru import logger
 
 from app.services import container
@@ -11,23 +14,31 @@ from app.api.server import start_server
 from app.scheduler import start_scheduler
 from app.scheduler import shutdown_scheduler
 from app.services import get_service
+from app.settings import SETTINGS
 from app.logger import setup_logger
 
 
+ROLES = ("api", "worker", "scheduler", "all")
 
-async def main() -> None:
-    os.system("cls" if platform.system() == "Windows" else "clear")
 
+async def main(role: str = "all", inline_worker: bool = True) -> None:
     try:
         setup_logger()
         await container.initialize()
-        await start_scheduler()
 
-        _, pending = await asyncio.wait([
-            asyncio.create_task(start_server()),
-            asyncio.create_task(get_service.neuro.start_execute()),
-            ], return_when=asyncio.FIRST_COMPLETED,
-        )
+        tasks = []
+        if role in ("scheduler", "all"):
+            await start_scheduler()
+        if role in ("api", "all"):
+            tasks.append(asyncio.create_task(start_server()))
+        if role == "worker" or (role == "all" and inline_worker):
+            tasks.append(asyncio.create_task(get_service.neuro.start_execute()))
+        if role == "scheduler":
+            # Задачи планировщика выполняются в фоне, держим цикл живым
+            tasks.append(asyncio.create_task(asyncio.Event().wait()))
+
+        logger.info(f"Запуск роли '{role}' (pid={os.getpid()})")
+        _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
         for task in pending:
             task.cancel()
         await asyncio.gather(*pending, return_exceptions=True)
@@ -41,9 +52,10 @@ async def main() -> None:
         await container.shutdown()
 
 
-if __name__ == "__main__":
+def run(role: str, inline_worker: bool = True) -> None:
+    """Запускает роль в текущем процессе."""
     try:
-        asyncio.run(main())
+        asyncio.run(main(role, inline_worker))
 
     except (KeyboardInterrupt, SystemExit) as e:
         logger.info(f"Получен сигнал {e.__class__.__name__}...")
@@ -51,3 +63,49 @@ if __name__ == "__main__":
     except Exception as e:
         logger.opt(exception=True).critical(f"Критическая ошибка: {e}")
         raise
+
+
+def spawn_workers(count: int) -> List[multiprocessing.process.BaseProcess]:
+    """Запускает count процессов-воркеров очереди (spawn: свой интерпретатор и event loop)."""
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=run, args=("worker",), name=f"queue-worker-{i}") for i in range(count)]
+    for proc in procs:
+        proc.start()
+    return procs
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app", description="Запуск сервиса TBank")
+    parser.add_argument(
+        "role", nargs="?", choices=ROLES, default=SETTINGS.APP_ROLE,
+        help="api — HTTP сервер, worker — обработка очереди, scheduler — периодические задачи, all — все вместе",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=SETTINGS.QUEUE_PROCESSES,
+        help="Число процессов воркеров очереди (для ролей worker и all)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.system("cls" if platform.system() == "Windows" else "clear")
+
+    # Один процесс воркеров — в общем event loop, больше — отдельными процессами
+    procs = spawn_workers(args.workers) if args.role in ("worker", "all") and args.workers > 1 else []
+    try:
+        if args.role == "worker" and procs:
+            for proc in procs:
+                proc.join()
+        else:
+            run(args.role, inline_worker=not procs)
+
+    except KeyboardInterrupt:
+        logger.info("Получен сигнал KeyboardInterrupt...")
+
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs:
+            proc.join()
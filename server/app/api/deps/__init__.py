@@ -5,13 +5,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.storage import get_session, User
 from .auth import get_current_user
+from .admin import verify_admin
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
 DBSession = Annotated[AsyncSession, Depends(get_session)]
+AdminAccess = Depends(verify_admin)
 
 
 __all__ = [
     "CurrentUser",
-    "DBSession"
+    "DBSession",
+    "AdminAccess",
 ]
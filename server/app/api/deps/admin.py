@@ -0,0 +1,11 @@
+import secrets
+
+from fastapi import Header, HTTPException, status
+
+from app.settings import SETTINGS
+
+
+async def verify_admin(x_admin_token: str = Header(default="")) -> None:
+    """Проверка сервисного токена администратора."""
+    if not SETTINGS.ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, SETTINGS.ADMIN_TOKEN):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Недостаточно прав")
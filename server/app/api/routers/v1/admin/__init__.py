@@ -0,0 +1,53 @@
+# fmt: off
+# isort: off
+from typing import List
+from fastapi import APIRouter, Query
+
+from app.api.deps import AdminAccess, DBSession
+from .manager import AdminRouterManager
+from .schemas import *
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[AdminAccess])
+
+
+@router.get("/queue/stats", response_model=QueueStatsResponse)
+async def get_queue_stats(db: DBSession) -> QueueStatsResponse:
+    """Статистика очереди запросов."""
+    return await AdminRouterManager.get_queue_stats(db)
+
+
+@router.get("/queue/pool", response_model=PoolStateResponse)
+async def get_pool() -> PoolStateResponse:
+    """Состояние пула воркеров и метрики автомасштабирования."""
+    return await AdminRouterManager.get_pool()
+
+
+@router.post("/queue/pool", response_model=PoolStateResponse)
+async def configure_pool(request: PoolConfigRequest) -> PoolStateResponse:
+    """Переопределение размера/границ пула воркеров."""
+    return await AdminRouterManager.configure_pool(request)
+
+
+@router.get("/queue/dead", response_model=List[DeadLetterResponse])
+async def list_dead(limit: int = Query(default=50, ge=1, le=1000)) -> List[DeadLetterResponse]:
+    """Запросы в dead-letter (исчерпаны попытки или неповторяемая ошибка)."""
+    return await AdminRouterManager.list_dead(limit)
+
+
+@router.post("/queue/dead/requeue", response_model=DeadLetterActionResponse)
+async def requeue_dead(request: DeadLetterActionRequest) -> DeadLetterActionResponse:
+    """Возвращает запросы из dead-letter в очередь со сброшенным счетчиком попыток."""
+    return await AdminRouterManager.requeue_dead(request)
+
+
+@router.post("/queue/dead/purge", response_model=DeadLetterActionResponse)
+async def purge_dead(request: DeadLetterActionRequest) -> DeadLetterActionResponse:
+    """Удаляет запросы из dead-letter."""
+    return await AdminRouterManager.purge_dead(request)
+
+
+@router.get("/neuro/intent", response_model=IntentMetricsResponse)
+async def get_intent_metrics() -> IntentMetricsResponse:
+    """Shadow-метрики классификатора, пропускающего проход тулов."""
+    return await AdminRouterManager.get_intent_metrics()
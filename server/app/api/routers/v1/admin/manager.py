@@ -0,0 +1,54 @@
+# fmt: off
+# isort: off
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services import get_service
+from .schemas import *
+
+
+class AdminRouterManager:
+    """Менеджер логики админского роутера."""
+
+    @staticmethod
+    async def get_queue_stats(db: AsyncSession) -> QueueStatsResponse:
+        """Статистика очереди."""
+        return QueueStatsResponse(**(await get_service.queue.get_statistics(db)).model_dump())
+
+
+    @staticmethod
+    async def get_pool() -> PoolStateResponse:
+        """Состояние пула воркеров."""
+        return PoolStateResponse(**(await get_service.queue.get_pool_state()).model_dump())
+
+
+    @staticmethod
+    async def configure_pool(request: PoolConfigRequest) -> PoolStateResponse:
+        """Переопределение пула воркеров."""
+        return PoolStateResponse(**(await get_service.queue.configure_pool(
+            **request.model_dump(exclude_none=True)
+        )).model_dump())
+
+
+    @staticmethod
+    async def list_dead(limit: int) -> List[DeadLetterResponse]:
+        """Запросы в dead-letter."""
+        return [DeadLetterResponse(**dead.model_dump()) for dead in await get_service.queue.list_dead(limit)]
+
+
+    @staticmethod
+    async def requeue_dead(request: DeadLetterActionRequest) -> DeadLetterActionResponse:
+        """Возврат запросов из dead-letter в очередь."""
+        return DeadLetterActionResponse(count=await get_service.queue.requeue_dead(request.ids))
+
+
+    @staticmethod
+    async def purge_dead(request: DeadLetterActionRequest) -> DeadLetterActionResponse:
+        """Удаление запросов из dead-letter."""
+        return DeadLetterActionResponse(count=await get_service.queue.purge_dead(request.ids))
+
+
+    @staticmethod
+    async def get_intent_metrics() -> IntentMetricsResponse:
+        """Метрики классификатора интентов."""
+        return IntentMetricsResponse(**await get_service.neuro.get_intent_metrics())
@@ -0,0 +1,72 @@
+# fmt: off
+# isort: off
+from uuid import UUID
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class QueueStatsResponse(BaseModel):
+    """Статистика очереди."""
+    pending: Dict[str, int]
+    processing: int
+    completed: int
+    failed: int
+
+
+class PoolStateResponse(BaseModel):
+    """Состояние пула воркеров."""
+    active: int
+    target: int
+    backlog: int
+    min_workers: int
+    max_workers: int
+    auto: bool
+    throughput: float
+    latency: float
+    error_ratio: float
+    throttle_ratio: float
+    processes: int = Field(default=1, description="Процессов-воркеров в сводке")
+
+
+class PoolConfigRequest(BaseModel):
+    """Ручная настройка пула воркеров."""
+    workers: Optional[int] = Field(default=None, ge=1, description="Фиксированный размер пула")
+    min_workers: Optional[int] = Field(default=None, ge=1)
+    max_workers: Optional[int] = Field(default=None, ge=1)
+    auto: Optional[bool] = Field(default=None, description="Вернуть автомасштабирование")
+
+
+class DeadLetterResponse(BaseModel):
+    """Запрос в dead-letter."""
+    id: UUID
+    user_id: UUID
+    priority: str
+    attempts: int
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
+
+
+class DeadLetterActionRequest(BaseModel):
+    """Выбор запросов из dead-letter."""
+    ids: Optional[List[UUID]] = Field(default=None, description="Если не задано — все запросы")
+
+
+class DeadLetterActionResponse(BaseModel):
+    """Результат операции над dead-letter."""
+    count: int
+
+
+class IntentMetricsResponse(BaseModel):
+    """Shadow-метрики классификатора интентов (позитив — проход тулов можно пропустить)."""
+    ready: bool
+    observed: int
+    skipped: int
+    tp: int
+    fp: int
+    tn: int
+    fn: int
+    skip_rate: float
+    precision: float
+    recall: float
+    missed_tools: float = Field(description="Доля сообщений, где пропуск потерял бы вызов тула")
@@ -1,10 +1,10 @@
 # fmt: off
 from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
 
 from app.api.deps import CurrentUser, DBSession
 from .manager import LLMRouterManager
-from app.storage import Subscription
 from .schemas import *
 
 
@@ -13,11 +13,12 @@ router = APIRouter(prefix="/message", tags=["Message"])
 
 @router.post("/new", response_model=ChatResponse)
 async def chat_completion(
-    request_data: ChatRequest, user: CurrentUser, db: DBSession
+    request_data: ChatRequest, user: CurrentUser, db: DBSession,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=128),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID", max_length=64),
 ):
     """Отправка сообщения в чат с AI моделью."""
-    if not await Subscription.check_user_limits(db, user.id):
-        raise HTTPException(status.HTTP_403_FORBIDDEN, "Лимиты исчерпаны или подписка неактивна")
+    # Лимиты проверяет атомарный резерв квоты при постановке в очередь
 
     # TODO: Расскоменить позже
     # if not await user.has_model_access(db, request_data.model):
@@ -25,7 +26,7 @@ async def chat_completion(
 
     if request_data.stream:
         return StreamingResponse(
-            LLMRouterManager.chat_stream(request_data, user, db),
+            await LLMRouterManager.chat_stream(request_data, user, db, idempotency_key, last_event_id),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -33,5 +34,5 @@ async def chat_completion(
             }
         )
     return await LLMRouterManager.chat_completion(
-        request_data, user, db
+        request_data, user, db, idempotency_key
     )
@@ -1,13 +1,16 @@
 # fmt: off
-import json
+import time
 import asyncio
+import hashlib
 
-from typing import AsyncGenerator
+from uuid import UUID, uuid4
 from fastapi import HTTPException, status
+from typing import AsyncGenerator, Dict, Optional, Set, Tuple
 
 from app.storage import RequestPriority
 from app.api.deps import CurrentUser, DBSession
 from app.services import get_service
+from app.services.srv_redis.events import StreamEvent, dumps, sse
 from app.settings import SETTINGS
 from .schemas import *
 
@@ -15,47 +18,160 @@ from .schemas import *
 class LLMRouterManager:
     """Менеджер для LLM роутера."""
 
+    _pending_cancels: Set[asyncio.Task] = set()
+
     @staticmethod
-    def _build_payload(request_data: ChatRequest) -> dict:
+    def _build_payload(request_data: ChatRequest, deadline: float) -> dict:
         return {
             "stream": request_data.stream,
             "text": request_data.text,
             "type": "text_completion",
             "model": request_data.model,
-            "chat_id": str(request_data.chat_id) if request_data.chat_id else None
+            "chat_id": str(request_data.chat_id) if request_data.chat_id else None,
+            "deadline": deadline,
         }
 
 
     @staticmethod
-    async def _add_request(request_data: ChatRequest, user: CurrentUser, db: DBSession):
-        return await get_service.queue.add_request(
-            db=db, user_id=user.id, payload=LLMRouterManager._build_payload(request_data),
-            priority=RequestPriority.PREMIUM if await user.is_premium(db) else RequestPriority.GENERAL
-        )
+    async def _add_request(request_data: ChatRequest, user: CurrentUser, db: DBSession, deadline: float):
+        """Резервирует запрос из квоты и ставит его в очередь; воркер спишет резерв по токену из payload."""
+        token = str(uuid4())
+        if not await get_service.sub.reserve_quota(db, user.id, token):
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "Лимиты исчерпаны или подписка неактивна")
+        try:
+            return await get_service.queue.add_request(
+                db=db, user_id=user.id, payload={**LLMRouterManager._build_payload(request_data, deadline), "quota": token},
+                priority=RequestPriority.PREMIUM if await user.is_premium(db) else RequestPriority.GENERAL
+            )
+        except BaseException:
+            await get_service.sub.release_quota(user.id, token)
+            raise
+
+
+    @staticmethod
+    def _dedup_keys(request_data: ChatRequest, user: CurrentUser, idempotency_key: Optional[str]) -> Dict[str, int]:
+        """Ключ дедупликации {ключ: ttl}: Idempotency-Key, а без него (если включено) — по содержимому
+        (пользователь, чат, модель, текст). Новый Idempotency-Key — всегда новый запрос, даже с тем же текстом."""
+        keys = {}
+        if idempotency_key:
+            keys[f"idem:{user.id}:{idempotency_key}"] = SETTINGS.IDEMPOTENCY_TTL
+        elif SETTINGS.DEDUP_WINDOW > 0:
+            digest = hashlib.sha256(
+                f"{request_data.chat_id}|{request_data.model}|{request_data.text}".encode("utf-8")
+            ).hexdigest()
+            keys[f"dedup:{user.id}:{digest}"] = SETTINGS.DEDUP_WINDOW
+        return keys
+
+
+    @staticmethod
+    async def _enqueue_once(
+        request_data: ChatRequest, user: CurrentUser, db: DBSession, deadline: float, idempotency_key: Optional[str]
+    ) -> Tuple[UUID, bool]:
+        """Ставит запрос в очередь или находит его дубль: (id запроса, новый ли он)."""
+        if not (keys := LLMRouterManager._dedup_keys(request_data, user, idempotency_key)):
+            return await LLMRouterManager._add_request(request_data, user, db, deadline), True
+
+        if (taken := await get_service.redis.reserve_keys(keys)):
+            if (request_id := await get_service.redis.resolve_key(taken)):
+                return request_id, False
+            raise HTTPException(status.HTTP_409_CONFLICT, "Такой запрос уже обрабатывается")
+
+        try:
+            request_id = await LLMRouterManager._add_request(request_data, user, db, deadline)
+        except BaseException:
+            await get_service.redis.release_keys(list(keys))
+            raise
+        await get_service.redis.bind_keys(list(keys), request_id)
+        return request_id, True
 
 
     @staticmethod
-    async def chat_completion(request_data: ChatRequest, user: CurrentUser, db: DBSession) -> ChatResponse:
-        request_id = await LLMRouterManager._add_request(request_data, user, db)
-        for _ in range(SETTINGS.MAX_TIMEOUT + 15):
-            if result := await get_service.redis.get_result(request_id):
-                if result.get("error"):
-                    raise HTTPException(
-                        status_code=result.get("status_code", 500),
-                        detail=result.get("message", "Internal server error")
-                    )
-                return ChatResponse(**result)
-            await asyncio.sleep(5)
-        raise HTTPException(status.HTTP_408_REQUEST_TIMEOUT, "Таймаут обработки")
+    async def _cancel_later(request_id: UUID) -> None:
+        """Отменяет запрос, если за CANCEL_GRACE к нему никто не переподключился."""
+        await asyncio.sleep(SETTINGS.CANCEL_GRACE)
+        if await get_service.redis.watchers(request_id) <= 0:
+            await get_service.redis.cancel(request_id)
 
 
     @staticmethod
-    async def chat_stream(request_data: ChatRequest, user: CurrentUser, db: DBSession) -> AsyncGenerator[str, None]:
-        request_id = await LLMRouterManager._add_request(request_data, user, db)
-        async for chunk in get_service.redis.subscribe_to_stream(request_id):
-            try:
-                yield chunk
-                if json.loads(chunk.replace("data: ", "").strip()).get("error"):
+    async def _detach(request_id: UUID, graceful: bool) -> None:
+        """Клиент перестал ждать ответ: последний ушедший отменяет запрос для воркеров."""
+        try:
+            if await get_service.redis.detach(request_id) > 0:
+                return
+            # Клиент с ключом дедупликации может повторить запрос — даем ему время переподключиться
+            if graceful and SETTINGS.CANCEL_GRACE > 0:
+                task = asyncio.create_task(LLMRouterManager._cancel_later(request_id))
+                LLMRouterManager._pending_cancels.add(task)
+                task.add_done_callback(LLMRouterManager._pending_cancels.discard)
+            else:
+                await get_service.redis.cancel(request_id)
+        except Exception:
+            pass
+
+
+    @staticmethod
+    async def chat_completion(
+        request_data: ChatRequest, user: CurrentUser, db: DBSession, idempotency_key: Optional[str] = None
+    ) -> ChatResponse:
+        deadline = time.time() + SETTINGS.MAX_TIMEOUT
+        request_id, _ = await LLMRouterManager._enqueue_once(request_data, user, db, deadline, idempotency_key)
+        await get_service.redis.attach(request_id)
+        answered = False
+        try:
+            if not (result := await get_service.redis.wait_result(request_id, deadline - time.time())):
+                raise HTTPException(status.HTTP_408_REQUEST_TIMEOUT, "Таймаут обработки")
+            answered = True
+            if result.get("error"):
+                raise HTTPException(
+                    status_code=result.get("status_code", 500),
+                    detail=result.get("message", "Internal server error")
+                )
+            return ChatResponse(**result)
+        finally:
+            # Таймаут или клиент оборвал соединение
+            if not answered:
+                await LLMRouterManager._detach(request_id, bool(idempotency_key) or SETTINGS.DEDUP_WINDOW > 0)
+
+
+    @staticmethod
+    async def chat_stream(
+        request_data: ChatRequest, user: CurrentUser, db: DBSession,
+        idempotency_key: Optional[str] = None, last_event_id: Optional[str] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """Ставит запрос в очередь до начала ответа (отказ уходит HTTP-статусом) и возвращает поток SSE-кадров."""
+        request_id, is_new = await LLMRouterManager._enqueue_once(
+            request_data, user, db, time.time() + SETTINGS.MAX_TIMEOUT, idempotency_key
+        )
+        return LLMRouterManager._stream_events(
+            request_id, is_new, last_event_id, bool(idempotency_key) or SETTINGS.DEDUP_WINDOW > 0
+        )
+
+
+    @staticmethod
+    async def _stream_events(
+        request_id: UUID, is_new: bool, last_event_id: Optional[str], graceful: bool
+    ) -> AsyncGenerator[bytes, None]:
+        await get_service.redis.attach(request_id)
+        finished = False
+        try:
+            # Повтор запроса, стрим которого уже истек, — отдаем готовый ответ целиком
+            if not is_new and not await get_service.redis.has_stream(request_id):
+                if result := await get_service.redis.get_result(request_id):
+                    finished = True
+                    yield sse(b"", dumps(result))
+                    return
+
+            # Новый запрос читает стрим с начала, повтор — после Last-Event-ID
+            async for event_id, kind, data in get_service.redis.subscribe_to_stream(
+                request_id, None if is_new else last_event_id
+            ):
+                yield sse(event_id, data)
+                if kind == StreamEvent.ERROR:
+                    finished = True
                     return
-            except Exception:
-                pass
+            finished = True
+        finally:
+            # Генератор закрыт до конца стрима — клиент отключился
+            if not finished:
+                await LLMRouterManager._detach(request_id, graceful)
@@ -7,6 +7,7 @@ from .msgs import router as msgs_router
 from .chats import router as chats_router
 from .payment import router as paymt_router
 from .llm import router as llm_router
+from .admin import router as admin_router
 
 from .purchases import router as purchases_router
 
@@ -20,6 +21,7 @@ router_v1.include_router(purchases_router)
 router_v1.include_router(msgs_router)
 router_v1.include_router(paymt_router)
 router_v1.include_router(llm_router)
+router_v1.include_router(admin_router)
 
 
 __all__ = ["router_v1"]
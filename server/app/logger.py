@@ -18,6 +18,15 @@ from .settings import SETTINGS
 LOG_FORMAT = "<level>{level: <8}</level> | [<cyan>{module}</cyan>] - {message}"
 
 
+def _is_intent(record) -> bool:
+    """Записи журнала решений роутера (logger.bind(intent=True)) — идут только в NEURO_INTENT_LOG."""
+    return record["extra"].get("intent", False)
+
+
+def _not_intent(record) -> bool:
+    return not _is_intent(record)
+
+
 class BatchLokiHandler:
     def __init__(self, loki_handler):
         self.queue = Queue()
@@ -78,6 +87,7 @@ def setup_logger():
             "sink": sys.stdout,
             "format": LOG_FORMAT,
             "level": SETTINGS.LOG_LEVEL,
+            "filter": _not_intent,
             "backtrace": True, "diagnose": True,
         },
         {
@@ -85,14 +95,26 @@ def setup_logger():
             "format": LOG_FORMAT,
             "level": SETTINGS.LOG_LEVEL,
             "rotation": "10 MB", "retention": "7 days", "encoding": "utf-8",
+            "filter": _not_intent,
         },
     ]
 
+    # Журнал решений роутера для обучения классификатора интентов
+    if SETTINGS.NEURO_INTENT_LOG:
+        handlers.append({
+            "sink": SETTINGS.NEURO_INTENT_LOG,
+            "format": "{message}",
+            "level": "INFO",
+            "filter": _is_intent,
+            "enqueue": True, "encoding": "utf-8",
+        })
+
     # Добавляем Loki handler только если он успешно создан
     if batch_handler:
         handlers.append({
             "sink": batch_handler,
             "level": SETTINGS.LOG_LEVEL,
+            "filter": _not_intent,
             "serialize": False,
         })
 
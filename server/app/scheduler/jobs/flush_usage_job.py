@@ -0,0 +1,32 @@
+# fmt: off
+# isort: off
+from typing import Any, Dict
+from loguru import logger
+
+from app.services import get_service
+from app.settings import SETTINGS
+from .base import BaseJob
+
+
+class Job(BaseJob):
+    """Запись накопленных в Redis req_used в subscriptions."""
+
+    @property
+    def job_id(self) -> str:
+        return "flush_usage_job"
+
+    @property
+    def trigger_type(self) -> str:
+        return "interval"
+
+    @property
+    def trigger_args(self) -> Dict[str, Any]:
+        return {"seconds": SETTINGS.QUOTA_FLUSH_INTERVAL}
+
+    async def execute(self) -> None:
+        """Пишет счетчики пачками, пока есть несохраненные."""
+        flushed = 0
+        while (count := await get_service.sub.flush_usage(SETTINGS.QUOTA_FLUSH_BATCH)):
+            flushed += count
+        if flushed:
+            logger.info(f"🍿 Записаны req_used для {flushed} пользователей")
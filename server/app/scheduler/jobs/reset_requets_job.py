@@ -5,6 +5,7 @@ from typing import Dict
 from loguru import logger
 
 from .base import BaseJob
+from app.services import get_service
 from app.storage import get_session, Subscription
 
 
@@ -25,6 +26,11 @@ class Job(BaseJob):
 
     async def execute(self) -> None:
         """Сбрасывает статистику всех пользователей."""
-        async for session in get_session():
-            reset_count = await Subscription.reset_requests(session)
-            logger.info(f"Сброшена статистика запросов для {reset_count} пользователей")
\ No newline at end of file
+        async def reset_db() -> int:
+            async for session in get_session():
+                return await Subscription.reset_requests(session)
+            return 0
+
+        # Сначала обнуляется кэш лимитов, затем БД — под той же блокировкой, что и запись счетчиков
+        reset_count = await get_service.sub.reset_usage(reset_db)
+        logger.info(f"Сброшена статистика запросов для {reset_count} пользователей")
\ No newline at end of file
@@ -1,10 +1,11 @@
 # fmt: off
 # isort: off
 from loguru import logger
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from .manager import NeuroManager
 from .objects import *
+from .toolcalls.intent import INTENT_STATS, intent_classifier
 
 
 class NeuroService:
@@ -18,3 +19,8 @@ class NeuroService:
     async def start_execute(self) -> None:
         """Запуск обработки очереди запросов."""
         await self._manager.start_execute()
+
+    async def get_intent_metrics(self) -> Dict[str, Any]:
+        """Shadow-метрики классификатора интентов (сумма по всем воркерам)."""
+        from app.services import get_service
+        return intent_classifier.metrics(await get_service.redis.get_stats(INTENT_STATS))
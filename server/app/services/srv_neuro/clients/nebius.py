@@ -39,9 +39,13 @@ class NebiusClient(BaseClient):
             )
 
             async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
+                if not chunk.choices:
+                    continue
+                # Дельты вызовов тулов отдаем вместе с текстом — их собирает ToolManager.stream_with_tools
+                if (delta := chunk.choices[0].delta).content or delta.tool_calls:
                     yield {
-                        "text": chunk.choices[0].delta.content,
+                        "text": delta.content,
+                        "tool_calls": delta.tool_calls,
                         "model": model,
                         "chunk": chunk
                     }
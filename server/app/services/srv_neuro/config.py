@@ -5,6 +5,7 @@
 TOOL_CALLS_MODEL = "gemini-1.5-flash"
 
 CHAT_TITLE_PROMPT = "Создай краткое название чата (2-5 слов) по теме сообщения. Только название, без кавычек!"
+DEFAULT_CHAT_TITLE = "Новый чат"
 
 BASE_SYSTEM_PROMPT = """
 Ты - AI финансовый помощник для контроля импульсивных покупок.
@@ -1,53 +1,121 @@
 # fmt: off
 # isort: off
 import json
+import asyncio
 
-from uuid import UUID
+from uuid import UUID, uuid4
 from loguru import logger
-from typing import Optional
+from sqlalchemy import select
+from typing import Any, AsyncGenerator, Dict, Optional, Set, Tuple
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.storage import Request, Subscription, get_session
+from app.settings import SETTINGS
+from app.storage import Subscription, Message, Chat, get_session
+from app.services.srv_queue.objects import Job
 from ..toolcalls.manager import tool_manager
+from ..toolcalls.intent import INTENT_STATS, intent_classifier, log_decision
 from ..objects import HandlerResponse
 from ..utils import HistoryManager
 from ..clients import get_client
 from ..config import *
+from .speculation import Speculation
 
 
 class BaseHandler(ABC):
     """Базовый обработчик нейросетевых запросов."""
 
+    # Фоновые задачи переживают обработчик (название чата для sync-ответа дописывается после него)
+    _background: Set[asyncio.Task] = set()
+
     def __init__(self):
         """Инициализация базового обработчика."""
         self._chat_id = None
+        self._chat_created = False
+        self._message_ids: list[UUID] = []
+        self._published = False  # Клиент уже получил часть ответа — повтор невозможен
+        self._title_task: Optional[asyncio.Task] = None
+        self._speculation: Optional[Speculation] = None
 
     @asynccontextmanager
-    async def _handle_errors(self, request: Request):
+    async def _handle_errors(self, request: Job):
         """Контекст менеджер для обработки ошибок."""
         from app.services import get_service
+        from app.services.srv_queue.retry import NonRetryableError, should_retry
         try:
             yield
 
+        except asyncio.CancelledError:
+            # Отмена клиентом или по дедлайну: ответ никто не ждет, незавершенные записи убираем
+            logger.info(f"Запрос {request.id} отменен в {self.__class__.__name__}")
+            self._cancel_title()
+            await self._rollback_attempt(request)
+            await self._release_quota(request)
+            raise
+
         except ValueError as e:
             logger.warning(f"Ошибка валидации в {self.__class__.__name__} [{e.__class__.__name__}]: {e}")
             await get_service.redis.set_error(request.id, str(e), 400, request.payload.get("stream", False))
+            await self._release_quota(request)
             raise
 
         except Exception as e:
+            # Очередь повторит запрос — клиент продолжает ждать, ошибку ему не отдаем
+            if not self._published and should_retry(e, request.attempts):
+                logger.warning(f"Транзиентная ошибка в {self.__class__.__name__} [{e.__class__.__name__}]: {e}, запрос будет повторен")
+                self._cancel_title()
+                await self._rollback_attempt(request)
+                raise
+
             logger.error(f"Неожиданная ошибка в {self.__class__.__name__} [{e.__class__.__name__}]: {e}", exc_info=True)
             await get_service.redis.set_error(request.id, str(e), 500, request.payload.get("stream", False))
+            await self._release_quota(request)
+            if self._published:
+                raise NonRetryableError(f"[{e.__class__.__name__}] {e}") from e
             raise
 
+        finally:
+            # Спекулятивный ответ не должен пережить обработку (ошибка, отмена или ответ уже отдан)
+            if self._speculation:
+                await self._speculation.cancel()
+
+
+    async def _rollback_attempt(self, request: Job) -> None:
+        """Откатывает записи неудачной попытки, чтобы повтор не задвоил историю чата."""
+        from app.services import get_service
+        try:
+            async for db in get_session():
+                if self._chat_created:
+                    await get_service.chat.delete_chat(db, self._chat_id, request.user_id)
+                else:
+                    for msg_id in self._message_ids:
+                        if msg := await db.get(Message, msg_id):
+                            await db.delete(msg)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Не удалось откатить попытку запроса {request.id}: {e}")
+
 
-    async def _update_usage(self, user_id: Optional[str] = None) -> None:
-        """Обновляет статистику использования."""
+    async def _update_usage(self, request: Job) -> None:
+        """Списывает резерв квоты в Redis; без кэша лимитов — напрямую в subscriptions."""
+        from app.services import get_service
+        if await get_service.sub.commit_quota(request.user_id, request.payload.get("quota")):
+            return
         async for db in get_session():
-            if not (success := await Subscription.increment_usage(db, user_id)):
+            if not (success := await Subscription.increment_usage(db, request.user_id)):
                 raise Exception("Статистика запросов не обновлена для юзера")
 
 
+    async def _release_quota(self, request: Job) -> None:
+        """Возвращает резерв квоты: запрос не будет выполнен."""
+        from app.services import get_service
+        try:
+            await get_service.sub.release_quota(request.user_id, request.payload.get("quota"))
+        except Exception as e:
+            logger.warning(f"Не удалось вернуть резерв квоты запроса {request.id}: {e}")
+
+
     def _extract_attachments(self, messages: list) -> list:
         """Извлекает файлы из результатов тулкалов."""
         attachments = []
@@ -80,23 +148,131 @@ class BaseHandler(ABC):
 
         except Exception as e:
             logger.warning(f"Ошибка генерации названия чата: {e}")
-            return "Новый чат"
+            return DEFAULT_CHAT_TITLE
 
 
-    async def _get_or_create_chat(self, request: Request) -> None:
-        """Получает существующий чат или создает новый."""
+    async def _generate_title(self, request: Job) -> None:
+        """Генерирует название нового чата в фоне и отправляет его клиенту событием стрима."""
         from app.services import get_service
+        if (title := await self._get_chat_title(request.payload.get("text"))) == DEFAULT_CHAT_TITLE:
+            return
+        try:
+            async for db in get_session():
+                await get_service.chat.update_chat_title(db, self._chat_id, request.user_id, title)
+                await db.commit()
+            if request.payload.get("stream"):
+                await get_service.redis.publish_chat_title(request.id, {
+                    "type": "chat_title", "chat_id": str(self._chat_id), "title": title
+                })
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить название чата {self._chat_id}: {e}")
 
-        async for db in get_session():
-            if (chat_id := request.payload.get("chat_id")):
-                if not (chat_info := await get_service.chat.get_chat(db, UUID(chat_id), request.user_id)):
-                    raise ValueError(f"Чат {chat_id} не найден или недоступен")
-                self._chat_id = chat_info.id
-            else:
-                title = await self._get_chat_title(request.payload.get("text"))
-                self._chat_id = (await get_service.chat.create_chat(
-                    db, request.user_id, title
-                )).id
+
+    async def _await_title(self, timeout: float = 5.0) -> None:
+        """Дожидается названия чата, чтобы его событие ушло до завершения стрима."""
+        if self._title_task and not self._title_task.done():
+            await asyncio.wait([self._title_task], timeout=timeout)
+
+
+    def _cancel_title(self) -> None:
+        if self._title_task and not self._title_task.done():
+            self._title_task.cancel()
+
+
+    async def _get_or_create_chat(self, db: AsyncSession, request: Job) -> Tuple[Chat, bool]:
+        """Получает существующий чат или добавляет в сессию новый (без commit). Возвращает чат и новый ли он."""
+        if (chat_id := request.payload.get("chat_id")):
+            if not (chat := await db.scalar(select(Chat).where(Chat.id == UUID(chat_id), Chat.user_id == request.user_id))):
+                raise ValueError(f"Чат {chat_id} не найден или недоступен")
+            return chat, False
+
+        db.add(chat := Chat(id=uuid4(), user_id=request.user_id, title=DEFAULT_CHAT_TITLE))
+        return chat, True
+
+
+    def _start_title(self, request: Job) -> None:
+        """Запускает генерацию названия нового чата параллельно с ответом — не задерживает первый токен."""
+        self._title_task = asyncio.create_task(self._generate_title(request))
+        BaseHandler._background.add(self._title_task)
+        self._title_task.add_done_callback(BaseHandler._background.discard)
+
+
+    def _inline_tools(self, request: Job) -> bool:
+        """Вызывает ли обработчик тулы сам, в стриме финального ответа (без отдельного прохода)."""
+        return False
+
+
+    def _answer_source(self, request: Job, messages: list) -> Optional[AsyncGenerator[Dict[str, Any], None]]:
+        """Генерация финального ответа без тулов — для спекулятивного запуска. None — обработчик не спекулирует."""
+        return None
+
+
+    @staticmethod
+    def _user_text(messages: list) -> str:
+        """Текст последнего сообщения пользователя (с учетом мультимодального формата)."""
+        for msg in reversed(messages):
+            if msg.get("role") == "user":
+                content = msg.get("content") or ""
+                if isinstance(content, list):
+                    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+                return str(content)
+        return ""
+
+
+    async def _run_tools(self, request: Job, messages: list) -> list:
+        """Проход тулов; классификатор интентов может его пропустить, для приоритетов из NEURO_SPECULATE
+        ответ параллельно генерируется в буфер."""
+        if self._inline_tools(request):
+            return messages
+
+        text, mode = self._user_text(messages), SETTINGS.NEURO_INTENT_MODE
+        score = intent_classifier.predict(text) if mode != "off" else 1.0
+        if mode == "on" and score < SETTINGS.NEURO_INTENT_THRESHOLD:
+            await self._count_intent("skipped")
+            logger.debug(f"Запрос {request.id}: проход тулов пропущен (score={score:.3f})")
+            return messages
+
+        processed = await self._route(request, messages)
+        tools = [msg.get("name") for msg in processed[len(messages):]]
+        if mode != "off":
+            # Без модели score всегда 1.0 — счетчики не пишем, но журнал нужен для обучения первой модели
+            if intent_classifier.ready:
+                await self._count_intent(intent_classifier.outcome(score, bool(tools), SETTINGS.NEURO_INTENT_THRESHOLD))
+            log_decision(text, tools, score)
+        return processed
+
+
+    @staticmethod
+    async def _count_intent(field: str) -> None:
+        """Счетчик shadow-метрик классификатора интентов; сбой Redis не мешает ответу."""
+        from app.services import get_service
+        try:
+            await get_service.redis.incr_stats(INTENT_STATS, field)
+        except Exception as e:
+            logger.warning(f"Не удалось учесть метрику интентов [{e.__class__.__name__}]: {e}")
+
+
+    async def _route(self, request: Job, messages: list) -> list:
+        """LLM-проход тулов (со спекулятивным ответом, если он включен для приоритета)."""
+        context = {"user_id": str(request.user_id), "chat_id": str(self._chat_id)}
+        if request.priority.value not in SETTINGS.NEURO_SPECULATE or not (
+            source := self._answer_source(request, self._clean_messages_for_final_request(messages))
+        ):
+            return await tool_manager.process_with_tools([*messages], TOOL_CALLS_MODEL, **context)
+
+        speculation = Speculation(source)
+        try:
+            processed = await tool_manager.process_with_tools([*messages], TOOL_CALLS_MODEL, **context)
+        except BaseException:
+            await speculation.cancel()
+            raise
+        if len(processed) > len(messages):
+            # Тулы вызваны — начатый ответ их не учитывает, генерируем заново
+            logger.info(f"Запрос {request.id}: вызваны тулы, спекулятивный ответ отменен")
+            await speculation.cancel()
+        else:
+            self._speculation = speculation
+        return processed
 
 
     def _clean_messages_for_final_request(self, messages: list) -> list:
@@ -104,39 +280,41 @@ class BaseHandler(ABC):
         return [{k: v for k, v in msg.items() if k != "tool_metadata"} for msg in messages]
 
 
-    async def process(self, request: Request) -> bool:
+    async def process(self, request: Job) -> bool:
         """Обработка запроса с общей логикой."""
         async with self._handle_errors(request):
             logger.info(f"Начало обработки запроса {request.id} от пользователя {request.user_id}")
 
-            # Получаем или создаем чат
-            await self._get_or_create_chat(request)
-            logger.info(f"Чат {self._chat_id} готов к работе")
-
+            # Все записи до генерации — одна сессия и одна транзакция
             async for db in get_session():
-                # Добавляем сообщение пользователя
-                await HistoryManager.add_user_message(
-                    db, self._chat_id, request.payload.get("text"),
+                # Получаем или создаем чат
+                chat, created = await self._get_or_create_chat(db, request)
+                self._chat_id = chat.id
+
+                # Сообщение пользователя и пустое сообщение ассистента — одной вставкой при commit
+                user_message, assistant_message = HistoryManager.add_turn(
+                    db, chat, request.payload.get("text"),
                     request.payload.get("model"), request.payload.get("attachments")
                 )
-                logger.info(f"Сообщение пользователя добавлено в чат {self._chat_id}")
 
-                # Получаем историю сообщений с системным промптом
-                messages = await HistoryManager.get_chat_history(db, self._chat_id, request.user_id)
+                # Получаем историю сообщений с системным промптом (новое сообщение добавляется из памяти,
+                # вставки уходят в БД одной пачкой при commit)
+                with db.no_autoflush:
+                    messages = await HistoryManager.get_chat_history(
+                        db, self._chat_id, request.user_id, new_chat=created, pending=user_message
+                    )
                 logger.info(f"Загружено {len(messages)} сообщений из истории (включая системный промпт)")
 
-                # Создаем пустое сообщение ассистента заранее
-                assistant_message = await HistoryManager.add_assistant_message(
-                    db, self._chat_id, "", request.payload.get("model")
-                )
-                logger.info(f"Создано сообщение ассистента {assistant_message.id}")
+                await db.commit()
+                self._chat_created = created
+                self._message_ids += [user_message.id, assistant_message.id]
+                logger.info(f"Чат {self._chat_id} готов к работе, создано сообщение ассистента {assistant_message.id}")
+
+            if self._chat_created:
+                self._start_title(request)
 
-            # Обрабатываем сообщения с тулкалами
-            processed_messages = await tool_manager.process_with_tools(
-                messages, TOOL_CALLS_MODEL,
-                user_id=str(request.user_id),
-                chat_id=str(self._chat_id)
-            )
+            # Обрабатываем сообщения с тулкалами: отдельным проходом (возможно, параллельно с ответом) или в стриме ответа
+            processed_messages = await self._run_tools(request, messages)
 
             # Извлекаем аттачменты из результатов тулкалов
             if (attachments := self._extract_attachments(processed_messages)):
@@ -149,6 +327,8 @@ class BaseHandler(ABC):
             # Выполняем основную логику - генерим финальный ответ с учетом результат туллкалов
             result = await self._execute(request, clean_messages, assistant_message.id, attachments)
             logger.info(f"Получен ответ от нейросети, длина: {len(result.content)} символов")
+            if result.metadata and (tool_msgs := result.metadata.get("tool_messages")):
+                processed_messages, attachments = [*processed_messages, *tool_msgs], result.attachments
 
             # Обновляем сообщение с результатом
             async for db in get_session():
@@ -158,13 +338,13 @@ class BaseHandler(ABC):
             logger.info(f"Сообщение ассистента {assistant_message.id} обновлено")
 
             # Обновляем статистику юзера
-            await self._update_usage(request.user_id)
+            await self._update_usage(request)
 
             logger.info(f"Чат-запрос {request.id} успешно выполнен")
             return True
 
 
     @abstractmethod
-    async def _execute(self, request: Request, messages: list, message_id: UUID, attachments: list = None) -> HandlerResponse:
+    async def _execute(self, request: Job, messages: list, message_id: UUID, attachments: list = None) -> HandlerResponse:
         """Основная логика обработчика. Должна быть реализована в наследниках."""
         pass
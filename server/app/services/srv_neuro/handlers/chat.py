@@ -3,16 +3,38 @@
 from uuid import UUID
 from datetime import datetime
 
-from app.storage.models import Request
+from app.settings import SETTINGS
+from app.services.srv_queue.objects import Job
+from ..toolcalls.manager import tool_manager
 from ..objects import HandlerResponse
 from ..clients import get_client
 from .base import BaseHandler
 
 
+# Модель стримингового ответа
+STREAM_MODEL = "Qwen/Qwen3-30B-A3B-Thinking-2507"
+
+
 class ChatHandler(BaseHandler):
     """Обработчик чат-запросов."""
 
-    async def _execute(self, req: Request, msgs: list, message_id: UUID, attachments: list = None) -> HandlerResponse:
+    def _inline_tools(self, request: Job) -> bool:
+        return bool(request.payload.get("stream")) and SETTINGS.NEURO_INLINE_TOOLS
+
+
+    def _answer_source(self, request: Job, messages: list):
+        if request.payload.get("stream"):
+            return get_client("NebiusLLM").chat_completion_stream(messages=messages, model=STREAM_MODEL)
+        return self._sync_answer(request, messages)
+
+
+    async def _sync_answer(self, req: Job, msgs: list):
+        """Обычный ответ одним чанком."""
+        yield {"text": (await get_client("GeminiLLM").chat_completion(
+            messages=msgs, model=req.payload.get("model"))
+        ).choices[0].message.content or ""}
+
+    async def _execute(self, req: Job, msgs: list, message_id: UUID, attachments: list = None) -> HandlerResponse:
         from app.services import get_service
         return await (self._stream if req.payload.get("stream") else self._sync)(req, self._chat_id, msgs, message_id, get_service, attachments)
 
@@ -20,6 +42,7 @@ class ChatHandler(BaseHandler):
     async def _stream(self, req, chat_id, msgs, message_id, svc, attachments=None):
         """Стриминг."""
         model = req.payload.get("model")
+        self._published = True
         await svc.redis.publish_message_start(req.id, {
             "message_id": str(message_id),
             "chat_id": str(chat_id),
@@ -30,23 +53,49 @@ class ChatHandler(BaseHandler):
             "status": "generating"
         })
 
-        content = ""
-        async for chunk in get_client("NebiusLLM").chat_completion_stream(
-            messages=msgs, model="Qwen/Qwen3-30B-A3B-Thinking-2507"
-        ):
-            if text := chunk.get("text"):
-                await svc.redis.publish_chunk(req.id, text)
-                content += text
+        parts, tool_msgs = [], []
+        if self._speculation:
+            source = self._speculation.replay()
+        elif self._inline_tools(req):
+            source = tool_manager.stream_with_tools(
+                "NebiusLLM", msgs, STREAM_MODEL, user_id=str(req.user_id), chat_id=str(chat_id)
+            )
+        else:
+            source = self._answer_source(req, msgs)
+        async with svc.redis.stream_writer(req.id) as writer:
+            async for chunk in source:
+                if text := chunk.get("text"):
+                    await writer.write(text)
+                    parts.append(text)
+                tool_msgs += chunk.get("tool_messages") or []
+        content = "".join(parts)
+
+        # Тулы, вызванные прямо в стриме, дают аттачменты уже после message_start
+        if (inline_attachments := self._extract_attachments(tool_msgs)):
+            attachments = [*(attachments or []), *inline_attachments]
 
+        # Полный ответ — для повторов клиента, подключившихся после конца стрима
+        await svc.redis.set_result(req.id, {
+            "id": str(message_id),
+            "chat_id": str(chat_id),
+            "role": "assistant",
+            "content": content,
+            "attachments": attachments,
+            "created_at": datetime.now().isoformat(),
+            "status": "completed",
+        })
+        await self._await_title()
         await svc.redis.publish_done(req.id, {
-            "status": "completed"
+            "status": "completed",
+            **({"attachments": attachments} if inline_attachments else {}),
         })
 
         return HandlerResponse(
             chat_id=chat_id,
             model=model,
             content=content,
-            attachments=attachments
+            attachments=attachments,
+            metadata={"tool_messages": tool_msgs} if tool_msgs else None
         )
 
 
@@ -55,10 +104,10 @@ class ChatHandler(BaseHandler):
         print(f"ChatHandler messages: ------------------ {msgs}")
 
         model = req.payload.get("model")
-        content = (await get_client("GeminiLLM").chat_completion(
-            messages=msgs, model=model)
-        ).choices[0].message.content or ""
+        source = self._speculation.replay() if self._speculation else self._answer_source(req, msgs)
+        content = "".join([chunk["text"] async for chunk in source])
 
+        self._published = True
         await svc.redis.set_result(req.id, {
             "id": str(message_id),
             "chat_id": str(chat_id),
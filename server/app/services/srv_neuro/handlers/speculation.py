@@ -0,0 +1,41 @@
+# fmt: off
+# isort: off
+import asyncio
+
+from typing import Any, AsyncGenerator, Dict
+
+
+_END = object()
+
+
+class Speculation:
+    """Финальный ответ, начатый до конца прохода тулов: чанки копятся в буфере и отдаются, если тулы не понадобились."""
+
+    def __init__(self, source: AsyncGenerator[Dict[str, Any], None]):
+        self._buffer: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump(source))
+
+
+    async def _pump(self, source: AsyncGenerator[Dict[str, Any], None]) -> None:
+        try:
+            async for chunk in source:
+                self._buffer.put_nowait(chunk)
+        except Exception as e:
+            # Ошибку генерации отдаем при чтении — как если бы она случилась в обычном проходе
+            self._buffer.put_nowait(e)
+        finally:
+            self._buffer.put_nowait(_END)
+
+
+    async def replay(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """Накопленные чанки сразу, дальше — по мере генерации."""
+        while (chunk := await self._buffer.get()) is not _END:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+    async def cancel(self) -> None:
+        """Отменяет генерацию (тулы вызваны — ответ нужно строить заново)."""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
@@ -1,9 +1,13 @@
 # fmt: off
 # isort: off
+import asyncio
+
 from loguru import logger
 from typing import Optional, Dict, Type
 
-from app.storage import RequestType, Request
+from app.storage import RequestType
+from app.services.srv_queue.objects import Job
+from app.services.srv_queue.retry import RequestCancelled
 from .handlers.base import BaseHandler
 from .handlers.chat import ChatHandler
 
@@ -23,7 +27,27 @@ class NeuroManager:
 
     async def start_execute(self) -> None:
         """Запуск обработки очереди запросов."""
-        await self._queue_service.start_processing(self._proc_req)
+        watcher = asyncio.create_task(self._watch_cancellations())
+        try:
+            await self._queue_service.start_processing(self._proc_req, self._release_quota)
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+
+    async def _watch_cancellations(self) -> None:
+        """Снимает выполняющиеся в этом процессе запросы по сигналу отмены из Redis."""
+        from app.services import get_service
+        while True:
+            try:
+                async for request_id in get_service.redis.listen_cancellations():
+                    if self._queue_service.cancel(request_id):
+                        logger.info(f"Запрос {request_id} отменен клиентом")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на отмены [{e.__class__.__name__}]: {e}")
+                await asyncio.sleep(1)
 
 
     def _get_handler(self, req_type: str) -> Optional[BaseHandler]:
@@ -39,7 +63,16 @@ class NeuroManager:
         return None
 
 
-    async def _proc_req(self, request: Request) -> None:
+    @staticmethod
+    async def _release_quota(request: Job) -> None:
+        """Запрос снят без выполнения (отмена до старта, дедлайн, dead-letter): возвращаем резерв квоты сразу,
+        а не по QUOTA_RESERVE_TTL. Повторный release безопасен — обработчик мог уже вернуть резерв сам."""
+        from app.services import get_service
+        if request.payload:
+            await get_service.sub.release_quota(request.user_id, request.payload.get("quota"))
+
+
+    async def _proc_req(self, request: Job) -> None:
         """Обработка запроса из очереди."""
         if not request or not request.payload:
             raise ValueError("Получен пустой запрос")
@@ -47,10 +80,15 @@ class NeuroManager:
         if not (req_type := request.payload.get("type")):
             raise ValueError("Тип запроса не указан")
 
+        # Клиент ушел, пока запрос ждал в очереди
+        from app.services import get_service
+        if await get_service.redis.is_cancelled(request.id):
+            raise RequestCancelled("Запрос отменен клиентом до начала обработки")
+
         await self._handle_req(req_type, request)
 
 
-    async def _handle_req(self, req_type: str, request: Request) -> None:
+    async def _handle_req(self, req_type: str, request: Job) -> None:
         """Обработка запроса через соответствующий обработчик."""
         if not (handler := self._get_handler(req_type)):
             raise ValueError(f"Неизвестный тип запроса: {req_type}")
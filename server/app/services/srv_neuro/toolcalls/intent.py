@@ -0,0 +1,122 @@
+# fmt: off
+# isort: off
+import re
+import math
+import orjson
+
+from pathlib import Path
+from loguru import logger
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.settings import SETTINGS
+
+
+# Признаки, которые почти всегда сопровождают вызов тула (ссылка, сумма, «добавь», «запрети», «накопил»)
+_PATTERNS: Dict[str, re.Pattern] = {
+    "url":     re.compile(r"https?://|www\.|\.(ru|com)/"),
+    "price":   re.compile(r"\d[\d\s.,]*\s*(₽|р\b|руб|тыс|к\b|k\b)"),
+    "number":  re.compile(r"\d{3,}"),
+    "add":     re.compile(r"добав|запиш|внеси|сохрани|хочу купить|присмотрел"),
+    "block":   re.compile(r"запрет|черн\w* спис|блэк|blacklist|больше не (покупа|бра)"),
+    "savings": re.compile(r"накоп|отложил|сбережен|на счет|на счёт|копил"),
+}
+_WORD = re.compile(r"\w+")
+_STEM = 6  # Грубый стемминг: первые символы слова — русские окончания не плодят признаки
+
+# Hash в Redis со счетчиками shadow-метрик — общий для всех воркеров
+INTENT_STATS = "stats:intent"
+
+
+def features(text: str) -> List[str]:
+    """Признаки сообщения: сработавшие регулярки и основы слов."""
+    text = text.lower()
+    found = [f"re:{name}" for name, pattern in _PATTERNS.items() if pattern.search(text)]
+    found.extend({f"w:{word[:_STEM]}" for word in _WORD.findall(text) if not word.isdigit()})
+    return found
+
+
+class IntentClassifier:
+    """Логистическая регрессия над признаками сообщения: вероятность того, что роутер вызовет тул.
+
+    Обучается офлайн на журнале решений роутера (NEURO_INTENT_LOG); без модели всегда отвечает 1.0 —
+    проход тулов не пропускается. Счетчики решений копятся в Redis (INTENT_STATS), а не в процессе:
+    классификатор работает в воркерах, а метрики читает API.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = 0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.weights)
+
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Загружает модель из JSON; при ошибке — пустой классификатор."""
+        if not path:
+            return cls()
+        try:
+            data = orjson.loads(Path(path).read_bytes())
+            return cls(data["weights"], data["bias"])
+        except Exception as e:
+            logger.warning(f"Модель интентов {path} не загружена [{e.__class__.__name__}]: {e}")
+            return cls()
+
+
+    def save(self, path: str) -> None:
+        Path(path).write_bytes(orjson.dumps({"weights": self.weights, "bias": self.bias}))
+
+
+    def predict(self, text: str) -> float:
+        """Вероятность вызова тула."""
+        if not self.ready:
+            return 1.0
+        z = self.bias + sum(self.weights.get(f, 0.0) for f in features(text))
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, z))))
+
+
+    def fit(self, samples: Iterable[Tuple[str, bool]], epochs: int = 20, lr: float = 0.1, l2: float = 1e-4) -> None:
+        """SGD по логлоссу: samples — пары (текст, вызывались ли тулы)."""
+        data = [(features(text), float(label)) for text, label in samples]
+        for _ in range(epochs):
+            for feats, label in data:
+                z = self.bias + sum(self.weights.get(f, 0.0) for f in feats)
+                grad = 1 / (1 + math.exp(-max(-30.0, min(30.0, z)))) - label
+                self.bias -= lr * grad
+                for f in feats:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - lr * (grad + l2 * w)
+
+
+    @staticmethod
+    def outcome(score: float, called: bool, threshold: float) -> str:
+        """Счетчик shadow-метрик для решения роутера (позитив — классификатор пропустил бы проход тулов)."""
+        skip = score < threshold
+        return ("t" if skip != called else "f") + ("p" if skip else "n")
+
+
+    def metrics(self, stats: Dict[str, int]) -> Dict[str, Any]:
+        """Shadow-метрики: точность/полнота пропуска и доля проходов тулов, которые можно не делать."""
+        s = {field: stats.get(field, 0) for field in ("tp", "fp", "tn", "fn", "skipped")}
+        total = s["tp"] + s["fp"] + s["tn"] + s["fn"]
+        return {
+            **s,
+            "ready": self.ready,
+            "observed": total,
+            "skip_rate": (s["tp"] + s["fp"]) / total if total else 0.0,
+            "precision": s["tp"] / (s["tp"] + s["fp"]) if s["tp"] + s["fp"] else 0.0,
+            "recall": s["tp"] / (s["tp"] + s["fn"]) if s["tp"] + s["fn"] else 0.0,
+            "missed_tools": s["fp"] / total if total else 0.0,
+        }
+
+
+def log_decision(text: str, tools: List[str], score: float) -> None:
+    """Пишет решение роутера в журнал для офлайн-обучения."""
+    if SETTINGS.NEURO_INTENT_LOG:
+        logger.bind(intent=True).info(orjson.dumps({"text": text, "tools": tools, "score": score}).decode())
+
+
+intent_classifier = IntentClassifier.load(SETTINGS.NEURO_INTENT_MODEL)
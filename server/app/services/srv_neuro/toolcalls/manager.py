@@ -3,31 +3,32 @@
 import json
 import asyncio
 
-from typing import Any, Dict, List
+from typing import Any, AsyncGenerator, Dict, List
+from app.settings import SETTINGS
 from ..clients import get_client
 from . import tool_registry
 
 
 class ToolManager:
-    async def _execute_tool_call(self, call, **context) -> Dict[str, Any]:
+    async def _execute_tool_call(self, call_id: str, name: str, arguments: str, **context) -> Dict[str, Any]:
         """Выполняет один tool call и возвращает результат с метаданными"""
         try:
-            args = json.loads(call.function.arguments or '{}')
+            args = json.loads(arguments or '{}')
             args.update(context)
             result = await tool_registry.execute_tool(
-                tool_name=call.function.name, **args
+                tool_name=name, **args
             )
 
             metadata = {
-                "tool_name": call.function.name,
+                "tool_name": name,
                 "arguments": args,
                 "result": result
-            } if tool_registry.get_tool(call.function.name) else None
+            } if tool_registry.get_tool(name) else None
 
             return {
                 "role": "tool",
-                "tool_call_id": call.id,
-                "name": call.function.name,
+                "tool_call_id": call_id,
+                "name": name,
                 "content": json.dumps(result, ensure_ascii=False),
                 "metadata": metadata
             }
@@ -35,13 +36,20 @@ class ToolManager:
         except Exception as e:
             return {
                 "role": "tool",
-                "tool_call_id": call.id,
-                "name": call.function.name,
+                "tool_call_id": call_id,
+                "name": name,
                 "content": f"Ошибка выполнения toolсall: {e}",
                 "metadata": None
             }
 
 
+    @staticmethod
+    def _tool_message(result: Dict[str, Any]) -> Dict[str, Any]:
+        tool_msg = {k: v for k, v in result.items() if k != "metadata"}
+        if result["metadata"]: tool_msg["tool_metadata"] = [result["metadata"]]
+        return tool_msg
+
+
     async def process_with_tools(self, msgs: List[Dict[str, Any]], model: str, **context) -> List[Dict[str, Any]]:
         response = await get_client("OpenaiLLM").chat_completion(
             model=model, messages=msgs, tools=tool_registry.get_openai_schemas() or None or None,
@@ -54,17 +62,54 @@ class ToolManager:
 
         # Выполняем все tool calls параллельно
         results = await asyncio.gather(*[
-            self._execute_tool_call(call, **context)
+            self._execute_tool_call(call.id, call.function.name, call.function.arguments, **context)
             for call in tool_calls
         ])
 
         # Добавляем tool messages с метаданными
-        for result in results:
-            tool_msg = {k: v for k, v in result.items() if k != "metadata"}
-            if result["metadata"]: tool_msg["tool_metadata"] = [result["metadata"]]
-            msgs.append(tool_msg)
-
+        msgs.extend(self._tool_message(result) for result in results)
         return msgs
 
 
+    async def stream_with_tools(
+        self, client: str, msgs: List[Dict[str, Any]], model: str, **context
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Один проход: финальный стрим сразу со схемами тулов. Текст отдается как есть ({"text"}); если модель
+        вызвала тулы — они выполняются ({"tool_messages"} с метаданными) и генерация продолжается с их результатами."""
+        schemas = tool_registry.get_openai_schemas() or None
+        for round_ in range(SETTINGS.NEURO_MAX_TOOL_ROUNDS + 1):
+            # Последний раунд — без тулов, модель обязана ответить текстом
+            tools = {"tools": schemas, "tool_choice": "auto"} if schemas and round_ < SETTINGS.NEURO_MAX_TOOL_ROUNDS else {}
+            calls: Dict[int, Dict[str, str]] = {}
+            parts: List[str] = []
+            async for chunk in get_client(client).chat_completion_stream(messages=msgs, model=model, **tools):
+                if text := chunk.get("text"):
+                    parts.append(text)
+                    yield {"text": text}
+                for delta in chunk.get("tool_calls") or []:
+                    call = calls.setdefault(delta.index, {"id": "", "name": "", "arguments": ""})
+                    call["id"] = delta.id or call["id"]
+                    if delta.function:
+                        call["name"] += delta.function.name or ""
+                        call["arguments"] += delta.function.arguments or ""
+
+            if not calls:
+                return
+
+            calls_list = [calls[index] for index in sorted(calls)]
+            # Текст раунда уже ушел клиенту — модель должна видеть его в истории, иначе перепишет заново
+            msgs.append({"role": "assistant", "content": "".join(parts) or None, "tool_calls": [
+                {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in calls_list
+            ]})
+            results = await asyncio.gather(*[
+                self._execute_tool_call(call["id"], call["name"], call["arguments"], **context)
+                for call in calls_list
+            ])
+            # В запрос к модели — без метаданных, наружу — с ними (история и аттачменты)
+            tool_msgs = [self._tool_message(result) for result in results]
+            msgs.extend({k: v for k, v in msg.items() if k != "tool_metadata"} for msg in tool_msgs)
+            yield {"tool_messages": tool_msgs}
+
+
 tool_manager = ToolManager()
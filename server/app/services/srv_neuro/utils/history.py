@@ -1,8 +1,9 @@
 # fmt: off
 # isort: off
-from uuid import UUID
-from typing import List, Dict
-from sqlalchemy import select, desc
+from uuid import UUID, uuid4
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import select, update, desc
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.storage import MessageRole, Message, Chat, User
@@ -13,14 +14,14 @@ class HistoryManager:
     """Менеджер истории сообщений чата."""
 
     @staticmethod
-    async def get_system_prompt(db: AsyncSession, chat_id: UUID, user_id: UUID) -> str:
+    async def get_system_prompt(db: AsyncSession, chat_id: UUID, user_id: UUID, new_chat: bool = False) -> str:
         """Получает системный промпт с контекстом пользователя и покупок."""
         from app.services import get_service
 
         if not (user := await db.get(User, user_id)):
             return BASE_SYSTEM_PROMPT
 
-        purchases = await get_service.purchase.get_chat_purchases(db, chat_id, user_id)
+        purchases = [] if new_chat else await get_service.purchase.get_chat_purchases(db, chat_id, user_id)
         
         # Формируем профиль
         profile = f"""\n\n=== ПРОФИЛЬ ===
@@ -94,71 +95,55 @@ class HistoryManager:
 
 
     @staticmethod
-    async def get_chat_history(db: AsyncSession, chat_id: UUID, user_id: UUID, limit: int = 10) -> List[Dict]:
-        """Получает последние сообщения чата в формате для нейросети."""
-        messages = (await db.execute(
+    async def get_chat_history(
+        db: AsyncSession, chat_id: UUID, user_id: UUID, limit: int = 10, new_chat: bool = False, pending: Optional[Message] = None
+    ) -> List[Dict]:
+        """Получает последние сообщения чата в формате для нейросети (pending — еще не записанное сообщение пользователя)."""
+        messages = [] if new_chat else list((await db.execute(
             select(Message).where(Message.chat_id == chat_id)
-            .order_by(desc(Message.created_at)).limit(limit)
-        )).scalars().all()
+            .order_by(desc(Message.created_at)).limit(limit - (pending is not None))
+        )).scalars().all())
 
         formatted_messages = []
-        for msg in reversed(messages):
+        for msg in [*reversed(messages), *([pending] if pending is not None else [])]:
             HistoryManager._move_assistant_attachments(msg, formatted_messages)
             formatted_messages.append(HistoryManager._format_message_content(msg))
 
-        if system_prompt := await HistoryManager.get_system_prompt(db, chat_id, user_id):
+        if system_prompt := await HistoryManager.get_system_prompt(db, chat_id, user_id, new_chat):
             formatted_messages.insert(0, {"role": "system", "content": system_prompt})
         return formatted_messages
 
 
     @staticmethod
-    async def add_user_message(db: AsyncSession, chat_id: UUID, content: str, model: str, attachments: list = None) -> None:
-        """Добавляет сообщение пользователя в чат."""
-        db.add(
-            msg := Message(
-                chat_id=chat_id,
-                content=content,
-                role=MessageRole.USER,
-                attachments=attachments,
-                status="completed",
-                model=model
-            )
+    def add_turn(db: AsyncSession, chat: Chat, content: str, model: str, attachments: list = None) -> Tuple[Message, Message]:
+        """Добавляет в сессию сообщение пользователя и пустое сообщение ассистента (без commit — одна вставка пачкой)."""
+        # Время задаем явно: now() в одной транзакции одинаковое, а порядок истории идет по created_at
+        now = datetime.now(timezone.utc)
+        user_msg = Message(
+            id=uuid4(), chat_id=chat.id, content=content, role=MessageRole.USER,
+            attachments=attachments, status="completed", model=model, created_at=now,
         )
-        if chat := await db.get(Chat, chat_id):
-            chat.last_message_at = msg.created_at
-        await db.commit()
-
-
-    @staticmethod
-    async def add_assistant_message(db: AsyncSession, chat_id: UUID, content: str, model: str) -> Message:
-        """Добавляет ответ ассистента в чат."""
-        db.add(
-            msg := Message(
-                chat_id=chat_id,
-                content=content,
-                role=MessageRole.ASSISTANT,
-                status="generating" if not content else "completed",
-                model=model
-            )
+        assistant_msg = Message(
+            id=uuid4(), chat_id=chat.id, content="", role=MessageRole.ASSISTANT,
+            status="generating", model=model, created_at=now + timedelta(microseconds=1),
         )
-        if chat := await db.get(Chat, chat_id):
-            chat.last_message_at = msg.created_at
-        await db.commit()
-        await db.refresh(msg)
-        return msg
+        db.add_all([user_msg, assistant_msg])
+        chat.last_message_at = now
+        return user_msg, assistant_msg
 
 
     @staticmethod
     async def update_assistant_message_with_tools(db, msg_id: UUID, content: str, msgs: list, attachments: list = None) -> None:
-        """Обновляет сообщение с автоматическим извлечением метаданных тулкалов."""
-        if message := await db.get(Message, msg_id):
-            message.content, message.status = content, "completed"
-            if attachments: message.attachments = attachments
-
-            # Извлекаем метаданные всех тулкалов
-            if (all_tools := [tool for msg in msgs if (tools := msg.get("tool_metadata"))
-                for tool in tools
-            ]):
-                message.tool_ids = [tool["tool_name"] for tool in all_tools]
-                message.meta_data = {"tools": all_tools}
-            await db.commit()
+        """Обновляет сообщение с автоматическим извлечением метаданных тулкалов (один UPDATE, без чтения)."""
+        values = {"content": content, "status": "completed"}
+        if attachments:
+            values["attachments"] = attachments
+
+        # Извлекаем метаданные всех тулкалов
+        if (all_tools := [tool for msg in msgs if (tools := msg.get("tool_metadata"))
+            for tool in tools
+        ]):
+            values["tool_ids"] = [tool["tool_name"] for tool in all_tools]
+            values["meta_data"] = {"tools": all_tools}
+        await db.execute(update(Message).where(Message.id == msg_id).values(**values))
+        await db.commit()
@@ -68,7 +68,7 @@ class APIKeyManager:
         if not (keys := APIKeyManager._parse_keys(key_val)):
             raise ValueError("No API keys found")
 
-        used_keys = set()
+        used_keys, last_error = set(), None
         for _ in range(min(max_retries, len(keys))):
             if not (available_keys := [k for k in keys if k not in used_keys]):
                 break
@@ -79,5 +79,7 @@ class APIKeyManager:
                 return await request_func(key)
             except Exception as e:
                 logger.warning(f"API key failed: {key[:8]}...{key[-4:]} - {str(e)}")
+                last_error = e
                 continue
-        raise Exception("All API keys failed")
+        # Причина сохраняется: по ней очередь решает, повторять ли запрос
+        raise Exception("All API keys failed") from last_error
@@ -1,12 +1,15 @@
 # fmt: off
 # isort: off
+import asyncio
+
 from uuid import UUID
 from loguru import logger
-from typing import Any, Dict, Optional, Callable, Awaitable
+from typing import Any, Dict, List, Optional, Callable, Awaitable
 
-from app.storage import RequestPriority, Request
+from app.storage import RequestPriority
 from .manager import QueueManager
-from .objects import QueueStats
+from .pool import PoolCoordinator
+from .objects import QueueStats, PoolState, DeadLetter, Job
 
 
 class QueueService:
@@ -15,6 +18,7 @@ class QueueService:
     def __init__(self, manager: Optional[QueueManager] = None):
         """Инициализация сервиса очереди."""
         self._manager = manager or QueueManager()
+        self._pool = PoolCoordinator(self._manager)
         logger.info("🚀 QueueService инициализирован")
 
     async def add_request(
@@ -24,9 +28,20 @@ class QueueService:
         """Добавляет запрос в очередь."""
         return await self._manager.enqueue(db, user_id, payload, priority)
 
-    async def start_processing(self, handler: Callable[[Request], Awaitable[bool]]) -> None:
-        """Запускает обработку очереди."""
-        await self._manager.process_queue(handler)
+    async def start_processing(
+        self, handler: Callable[[Job], Awaitable[bool]], on_drop: Optional[Callable[[Job], Awaitable[None]]] = None
+    ) -> None:
+        """Запускает обработку очереди (пул синхронизируется с настройкой и сводкой в Redis)."""
+        sync = asyncio.create_task(self._pool.run())
+        try:
+            await self._manager.process_queue(handler, on_drop)
+        finally:
+            sync.cancel()
+            await asyncio.gather(sync, return_exceptions=True)
+
+    def cancel(self, request_id: UUID) -> bool:
+        """Отменяет выполняющийся в этом процессе запрос."""
+        return self._manager.cancel(request_id)
 
     async def mark_completed(self, db, request_id: UUID) -> bool:
         """Отмечает запрос как выполненный."""
@@ -40,6 +55,30 @@ class QueueService:
         """Получает статистику очереди."""
         return await self._manager.get_queue_stats(db)
 
+    async def get_pool_state(self) -> PoolState:
+        """Получает сводное состояние пулов всех процессов-воркеров."""
+        return await self._pool.state()
+
+    async def configure_pool(
+        self, workers: Optional[int] = None, min_workers: Optional[int] = None,
+        max_workers: Optional[int] = None, auto: Optional[bool] = None,
+    ) -> PoolState:
+        """Переопределяет размер/границы пула воркеров (каждого процесса; применяется на шаге автоскейлера)."""
+        await self._pool.configure(workers=workers, min_workers=min_workers, max_workers=max_workers, auto=auto)
+        return await self._pool.state()
+
+    async def list_dead(self, limit: int = 50) -> List[DeadLetter]:
+        """Получает запросы из dead-letter."""
+        return await self._manager.list_dead(limit)
+
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Возвращает запросы из dead-letter в очередь (все, если ids не заданы)."""
+        return await self._manager.requeue_dead(ids)
+
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет запросы из dead-letter (все, если ids не заданы)."""
+        return await self._manager.purge_dead(ids)
+
     async def cleanup_completed(self, db, days: int = 7) -> int:
         """Удаляет старые завершенные запросы."""
         return await self._manager.cleanup_completed(db, days)
@@ -0,0 +1,96 @@
+# fmt: off
+# isort: off
+import asyncio
+
+from uuid import UUID
+from loguru import logger
+from typing import Dict, List, Tuple, Callable, Awaitable, Optional
+
+
+class AckBuffer:
+    """Буфер подтверждений: копит завершенные/упавшие/повторяемые запросы всех воркеров и пишет их пачками."""
+
+    def __init__(
+        self, writer: Callable[[List[UUID], Dict[UUID, str], Dict[UUID, Tuple[float, str]]], Awaitable[int]],
+        interval: float, size: int, on_flush: Optional[Callable[[], None]] = None
+    ):
+        self.size = size
+        self.writer = writer
+        self.on_flush = on_flush
+        self.interval = interval
+        self._done: List[UUID] = []
+        self._failed: Dict[UUID, str] = {}
+        self._retry: Dict[UUID, Tuple[float, str]] = {}
+        self._full = asyncio.Event()
+        self._task = None
+
+
+    def __len__(self) -> int:
+        return len(self._done) + len(self._failed) + len(self._retry)
+
+
+    def complete(self, req_id: UUID) -> None:
+        """Ставит запрос в очередь на удаление."""
+        self._done.append(req_id)
+        if len(self) >= self.size: self._full.set()
+
+
+    def fail(self, req_id: UUID, error: str) -> None:
+        """Ставит запрос в очередь на пометку FAILED."""
+        self._failed[req_id] = error
+        if len(self) >= self.size: self._full.set()
+
+
+    def retry(self, req_id: UUID, delay: float, error: str) -> None:
+        """Ставит запрос в очередь на повтор через delay секунд."""
+        self._retry[req_id] = (delay, error)
+        if len(self) >= self.size: self._full.set()
+
+
+    async def flush(self) -> int:
+        """Пишет накопленные подтверждения одной пачкой через бэкенд очереди."""
+        done, self._done = self._done, []
+        failed, self._failed = self._failed, {}
+        retry, self._retry = self._retry, {}
+        if not done and not failed and not retry:
+            return 0
+
+        try:
+            await self.writer(done, failed, retry)
+
+        except Exception as e:
+            # Возвращаем в буфер, иначе аренда истечет и запрос обработается повторно
+            logger.error(f"🚀 Ошибка записи подтверждений [{e.__class__.__name__}]: {e}")
+            self._done[:0] = done
+            self._failed = {**failed, **self._failed}
+            self._retry = {**retry, **self._retry}
+            return 0
+
+        logger.debug(f"🚀 Подтверждено: completed={len(done)}, failed={len(failed)}, retry={len(retry)}")
+        if self.on_flush: self.on_flush()
+        return len(done) + len(failed) + len(retry)
+
+
+    async def _run(self) -> None:
+        """Сбрасывает буфер каждые interval секунд или при заполнении."""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+
+    def start(self) -> None:
+        """Запускает фоновую запись."""
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и дописывает остаток."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
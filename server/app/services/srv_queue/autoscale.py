@@ -0,0 +1,105 @@
+# fmt: off
+# isort: off
+import math
+import time
+
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from app.settings import SETTINGS
+from .objects import PoolState
+from .retry import is_retryable, is_throttled
+
+
+class WorkerAutoscaler:
+    """Контроллер размера пула воркеров по глубине очереди, латентности и ошибкам провайдера."""
+
+    def __init__(self, workers: int, min_workers: int, max_workers: int, window: float = 60.0):
+        self.window = window
+        self.target = workers
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.override: Optional[int] = None
+        self._samples: Deque[Tuple[float, float, bool, bool]] = deque()
+
+
+    def observe(self, duration: float, error: Optional[BaseException] = None) -> None:
+        """Учитывает результат обработки одного запроса. В долю ошибок идут только транзиентные ошибки
+        провайдера: невалидный запрос (ValueError, NonRetryableError) о нагрузке ничего не говорит."""
+        throttled = error is not None and is_throttled(error)
+        failed = throttled or (error is not None and is_retryable(error))
+        self._samples.append((time.monotonic(), duration, not failed, throttled))
+
+
+    def _trim(self) -> None:
+        """Отбрасывает наблюдения старше окна."""
+        edge = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < edge:
+            self._samples.popleft()
+
+
+    def _metrics(self) -> Tuple[float, float, float, float]:
+        """Пропускная способность (rps), средняя латентность, доля ошибок и доля 429 за окно."""
+        self._trim()
+        if not (total := len(self._samples)):
+            return 0.0, 0.0, 0.0, 0.0
+        latency = sum(s[1] for s in self._samples) / total
+        errors = sum(1 for s in self._samples if not s[2]) / total
+        throttled = sum(1 for s in self._samples if s[3]) / total
+        return total / self.window, latency, errors, throttled
+
+
+    def _clamp(self, value: int) -> int:
+        return max(self.min_workers, min(self.max_workers, value))
+
+
+    def decide(self, backlog: int, busy: int) -> int:
+        """Возвращает новый целевой размер пула."""
+        if self.override is not None:
+            self.target = self._clamp(self.override)
+            return self.target
+
+        rps, latency, errors, throttled = self._metrics()
+
+        # Провайдер режет по лимитам / сыплет ошибками — мультипликативно сбрасываем конкурентность
+        if throttled >= SETTINGS.QUEUE_AUTOSCALE_THROTTLE_RATIO:
+            self.target = self._clamp(math.floor(self.target * 0.5))
+            return self.target
+        if errors >= SETTINGS.QUEUE_AUTOSCALE_ERROR_RATIO:
+            self.target = self._clamp(math.floor(self.target * 0.75))
+            return self.target
+
+        # Закон Литтла: нужная конкурентность = поток * латентность, плюс разбор бэклога.
+        # При замедлении провайдера латентность растет — пул растет вместе с ней
+        needed = math.ceil(rps * latency) + backlog if rps else busy + backlog
+
+        # Двигаемся к цели плавно: рост быстрый, сжатие постепенное
+        if needed > self.target:
+            self.target = self._clamp(self.target + math.ceil((needed - self.target) / 2))
+        elif needed < self.target * 0.5:
+            self.target = self._clamp(self.target - max(1, math.ceil(self.target * 0.1)))
+        return self.target
+
+
+    def configure(
+        self, workers: Optional[int] = None, min_workers: Optional[int] = None,
+        max_workers: Optional[int] = None, auto: Optional[bool] = None,
+    ) -> None:
+        """Ручная настройка: границы, фиксированный размер или возврат к авто."""
+        if min_workers is not None: self.min_workers = max(1, min_workers)
+        if max_workers is not None: self.max_workers = max(self.min_workers, max_workers)
+        if workers is not None: self.override = workers
+        if auto: self.override = None
+        self.target = self._clamp(self.override if self.override is not None else self.target)
+
+
+    def state(self, active: int, backlog: int) -> PoolState:
+        """Текущее состояние контроллера."""
+        rps, latency, errors, throttled = self._metrics()
+        return PoolState(
+            active=active, target=self.target, backlog=backlog,
+            min_workers=self.min_workers, max_workers=self.max_workers,
+            auto=self.override is None, throughput=round(rps, 3),
+            latency=round(latency, 3), error_ratio=round(errors, 3),
+            throttle_ratio=round(throttled, 3),
+        )
@@ -0,0 +1,27 @@
+# fmt: off
+# isort: off
+from .base import QueueBackend
+from .postgres import PostgresBackend
+from .streams import RedisStreamsBackend
+from .memory import MemoryBackend
+
+_BACKENDS = {
+    "postgres": PostgresBackend,
+    "redis":    RedisStreamsBackend,
+    "memory":   MemoryBackend,
+}
+
+def get_backend(name: str) -> QueueBackend:
+    """Получает бэкенд очереди по имени."""
+    if name not in _BACKENDS:
+        raise ValueError(f"Бэкенд очереди '{name}' не найден")
+    return _BACKENDS[name]()
+
+
+__all__ = [
+    "QueueBackend",
+    "PostgresBackend",
+    "RedisStreamsBackend",
+    "MemoryBackend",
+    "get_backend",
+]
@@ -0,0 +1,77 @@
+# fmt: off
+# isort: off
+from uuid import UUID
+from abc import ABC, abstractmethod
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.storage import RequestStatus, RequestPriority
+from ..objects import DeadLetter, Job
+
+
+class QueueBackend(ABC):
+    """Базовый бэкенд хранения очереди запросов."""
+
+    # Лимит запросов в работе на пользователя, который бэкенд соблюдает при захвате (0 — нет)
+    user_cap: int = 0
+
+    @abstractmethod
+    async def enqueue(
+        self, db: AsyncSession, user_id: UUID, payload: Dict[str, Any], priority: RequestPriority
+    ) -> UUID:
+        """Добавляет запрос и будит слушателей."""
+        pass
+
+    @abstractmethod
+    async def claim(self, priority: RequestPriority, count: int) -> List[Job]:
+        """Атомарно захватывает до count запросов приоритета priority."""
+        pass
+
+    @abstractmethod
+    async def count(self) -> Dict[Tuple[RequestStatus, RequestPriority], int]:
+        """Количество запросов по (статус, приоритет)."""
+        pass
+
+    @abstractmethod
+    async def ack(self, done: List[UUID], failed: Dict[UUID, str], retry: Dict[UUID, Tuple[float, str]]) -> int:
+        """Подтверждает пачку завершенных, упавших и отложенных на повтор (задержка, ошибка) запросов."""
+        pass
+
+    @abstractmethod
+    async def renew(self, ids: List[UUID]) -> int:
+        """Продлевает аренду запросов, которые держит этот процесс."""
+        pass
+
+    @abstractmethod
+    async def release_expired(self) -> Tuple[int, List[Job]]:
+        """Возвращает в очередь запросы с истекшей арендой: (возвращено, ушедшие в dead-letter)."""
+        pass
+
+    @abstractmethod
+    async def listen(self, on_notify: Callable[[Optional[str]], None]) -> None:
+        """Бесконечно слушает уведомления о новых запросах (payload — приоритет нового запроса или None)."""
+        pass
+
+    @abstractmethod
+    async def cleanup(self, days: int) -> int:
+        """Удаляет старые завершенные/упавшие запросы."""
+        pass
+
+    @abstractmethod
+    async def list_dead(self, limit: int) -> List[DeadLetter]:
+        """Запросы в dead-letter, новые первыми."""
+        pass
+
+    @abstractmethod
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Возвращает запросы из dead-letter в очередь (все, если ids не заданы)."""
+        pass
+
+    @abstractmethod
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет запросы из dead-letter (все, если ids не заданы)."""
+        pass
+
+    async def close(self) -> None:
+        """Освобождает ресурсы бэкенда."""
+        pass
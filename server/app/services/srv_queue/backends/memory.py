@@ -0,0 +1,178 @@
+# fmt: off
+# isort: off
+import time
+import heapq
+import asyncio
+
+from uuid import UUID, uuid4
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.storage import RequestStatus, RequestPriority, Request
+from app.settings import SETTINGS
+from ..objects import DeadLetter, Job
+from .base import QueueBackend
+
+
+class MemoryBackend(QueueBackend):
+    """Очередь в памяти процесса — для бенчмарков и локальной отладки (без реплик и персистентности)."""
+
+    def __init__(self) -> None:
+        self._pending: Dict[RequestPriority, Deque[Request]] = {p: deque() for p in RequestPriority}
+        self._delayed: List[Tuple[float, int, Request]] = []
+        self._processing: Dict[UUID, Tuple[Request, float]] = {}
+        self._failed: Dict[UUID, Request] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._seq = 0
+
+
+    def _notify(self, payload: Optional[str] = None) -> None:
+        for on_notify in self._listeners:
+            on_notify(payload)
+
+
+    def _push(self, req: Request) -> None:
+        req.status, req.locked_at = RequestStatus.PENDING, None
+        self._pending[req.priority].append(req)
+
+
+    def _promote_delayed(self) -> None:
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._push(heapq.heappop(self._delayed)[2])
+
+
+    async def enqueue(
+        self, db: Optional[AsyncSession], user_id: UUID, payload: Dict[str, Any], priority: RequestPriority
+    ) -> UUID:
+        """Добавляет запрос в очередь."""
+        self._push(req := Request(
+            id=uuid4(), user_id=user_id, priority=priority, payload=payload,
+            attempts=0, created_at=datetime.now(),
+        ))
+        self._notify(priority.value)
+        return req.id
+
+
+    async def claim(self, priority: RequestPriority, count: int) -> List[Job]:
+        """Забирает до count запросов из головы очереди приоритета."""
+        self._promote_delayed()
+        queue, jobs = self._pending[priority], []
+        while queue and len(jobs) < count:
+            req = queue.popleft()
+            req.status, req.locked_at, req.attempts = RequestStatus.PROCESSING, datetime.now(), req.attempts + 1
+            self._processing[req.id] = (req, time.monotonic())
+            jobs.append(Job(req.id, req.user_id, req.priority, req.payload, req.attempts, req.created_at))
+        return jobs
+
+
+    async def count(self) -> Dict[Tuple[RequestStatus, RequestPriority], int]:
+        """Счетчики по (статус, приоритет)."""
+        counts = {(RequestStatus.PENDING, p): len(q) for p, q in self._pending.items()}
+        for _, _, req in self._delayed:
+            counts[(RequestStatus.PENDING, req.priority)] += 1
+        for req, _ in self._processing.values():
+            key = (RequestStatus.PROCESSING, req.priority)
+            counts[key] = counts.get(key, 0) + 1
+        for req in self._failed.values():
+            key = (RequestStatus.FAILED, req.priority)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+    async def ack(self, done: List[UUID], failed: Dict[UUID, str], retry: Dict[UUID, Tuple[float, str]]) -> int:
+        """Снимает запросы с обработки."""
+        acked = 0
+        for req_id in [*done, *failed, *retry]:
+            if not (entry := self._processing.pop(req_id, None)):
+                continue
+            req, acked = entry[0], acked + 1
+            if req_id in failed:
+                req.status, req.error, req.processed_at = RequestStatus.FAILED, failed[req_id], datetime.now()
+                self._failed[req_id] = req
+            elif req_id in retry:
+                delay, req.error = retry[req_id]
+                self._seq += 1
+                heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, req))
+        return acked
+
+
+    async def renew(self, ids: List[UUID]) -> int:
+        """Продлевает аренду."""
+        renewed = 0
+        for req_id in ids:
+            if req_id in self._processing:
+                self._processing[req_id] = (self._processing[req_id][0], time.monotonic())
+                renewed += 1
+        return renewed
+
+
+    async def release_expired(self) -> Tuple[int, List[Job]]:
+        """Возвращает в очередь запросы с истекшей арендой."""
+        edge, requeued, failed = time.monotonic() - SETTINGS.QUEUE_LEASE_TIMEOUT, 0, []
+        for req_id, (req, locked) in list(self._processing.items()):
+            if locked >= edge:
+                continue
+            del self._processing[req_id]
+            if req.attempts >= SETTINGS.QUEUE_MAX_ATTEMPTS:
+                req.status, req.processed_at = RequestStatus.FAILED, datetime.now()
+                req.error = "Истекла аренда запроса, попытки исчерпаны"
+                self._failed[req_id] = req
+                failed.append(Job(req.id, req.user_id, req.priority, req.payload, req.attempts, req.created_at))
+            else:
+                self._push(req)
+                requeued += 1
+        if requeued:
+            self._notify()
+        return requeued, failed
+
+
+    async def listen(self, on_notify: Callable[[Optional[str]], None]) -> None:
+        """Регистрирует слушателя и ждет отмены."""
+        self._listeners.append(on_notify)
+        try:
+            on_notify()
+            await asyncio.Event().wait()
+        finally:
+            self._listeners.remove(on_notify)
+
+
+    async def cleanup(self, days: int) -> int:
+        """Удаляет старые упавшие запросы."""
+        threshold = datetime.now() - timedelta(days=days)
+        old = [req_id for req_id, req in self._failed.items() if req.processed_at < threshold]
+        for req_id in old:
+            del self._failed[req_id]
+        return len(old)
+
+
+    async def list_dead(self, limit: int) -> List[DeadLetter]:
+        """Запросы в dead-letter, новые первыми."""
+        return [
+            DeadLetter(
+                id=req.id, user_id=req.user_id, priority=req.priority.value,
+                attempts=req.attempts, error=req.error, processed_at=req.processed_at,
+            )
+            for req in sorted(self._failed.values(), key=lambda r: r.processed_at, reverse=True)[:limit]
+        ]
+
+
+    def _take_dead(self, ids: Optional[List[UUID]]) -> List[Request]:
+        return [self._failed.pop(req_id) for req_id in list(self._failed if ids is None else ids) if req_id in self._failed]
+
+
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Возвращает запросы из dead-letter в очередь."""
+        for req in (taken := self._take_dead(ids)):
+            req.attempts, req.error, req.processed_at = 0, None, None
+            self._push(req)
+        if taken:
+            self._notify()
+        return len(taken)
+
+
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет запросы из dead-letter."""
+        return len(self._take_dead(ids))
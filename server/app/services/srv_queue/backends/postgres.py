@@ -0,0 +1,292 @@
+# fmt: off
+# isort: off
+import asyncio
+import asyncpg
+
+from uuid import UUID
+from loguru import logger
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, delete, func, case, or_, bindparam
+
+from app.storage import RequestStatus, RequestPriority, Request, get_session
+from app.settings import SETTINGS
+from ..objects import DeadLetter, Job
+from .base import QueueBackend
+
+
+# Канал Postgres NOTIFY для пробуждения feeder'а при новых запросах
+NOTIFY_CHANNEL = "queue_new_request"
+
+
+class PostgresBackend(QueueBackend):
+    """Очередь на таблице requests (FOR UPDATE SKIP LOCKED + LISTEN/NOTIFY)."""
+
+    @property
+    def user_cap(self) -> int:
+        return SETTINGS.QUEUE_USER_MAX_INFLIGHT
+
+
+    async def enqueue(
+        self, db: AsyncSession, user_id: UUID, payload: Dict[str, Any], priority: RequestPriority
+    ) -> UUID:
+        """Добавляет запрос в очередь."""
+        db.add(req := Request(
+            user_id=user_id,
+            priority=priority,
+            payload=payload,
+        ))
+        # NOTIFY доставляется слушателям только после коммита транзакции
+        await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, priority.value)))
+        await db.commit()
+        return req.id
+
+
+    def _fair_candidates(self, priority: RequestPriority, count: int):
+        """Кандидаты на захват: round-robin по пользователям с лимитом in-flight на пользователя.
+
+        Сначала SKIP LOCKED блокирует ограниченный пул самых старых PENDING (count * QUEUE_CLAIM_POOL),
+        и только внутри него ранжирует: реплики берут непересекающиеся пулы и не выбирают одни и те же строки.
+        Справедливость — в пределах пула; пользователи, уже выбравшие лимит, в пул не попадают и не вытесняют
+        из него остальных.
+        """
+        busy = (
+            select(Request.user_id, func.count(Request.id).label("busy"))
+            .where(Request.status == RequestStatus.PROCESSING)
+            .group_by(Request.user_id).subquery()
+        )
+        pool = (
+            select(Request.id, Request.user_id, Request.created_at)
+            .where(
+                Request.status == RequestStatus.PENDING, Request.priority == priority,
+                or_(Request.available_at.is_(None), Request.available_at <= datetime.now()),
+            )
+            .order_by(Request.created_at)
+            .limit(count * SETTINGS.QUEUE_CLAIM_POOL)
+            .with_for_update(skip_locked=True)
+        )
+        if (cap := self.user_cap) > 0:
+            pool = pool.where(Request.user_id.not_in(select(busy.c.user_id).where(busy.c.busy >= cap)))
+        pool = pool.cte("pool")
+        ranked = (
+            select(
+                pool.c.id, pool.c.created_at,
+                func.row_number().over(partition_by=pool.c.user_id, order_by=pool.c.created_at).label("rn"),
+                func.coalesce(busy.c.busy, 0).label("busy"),
+            )
+            .outerjoin(busy, busy.c.user_id == pool.c.user_id)
+            .subquery()
+        )
+
+        # rn — номер запроса в очереди пользователя: сначала по одному от каждого, потом по второму и т.д.
+        query = select(ranked.c.id).order_by(ranked.c.rn, ranked.c.created_at).limit(count)
+        if cap > 0:
+            query = query.where(ranked.c.rn + ranked.c.busy <= cap)
+        return query
+
+
+    async def claim(self, priority: RequestPriority, count: int) -> List[Job]:
+        """Атомарно захватывает пачку запросов (безопасно для нескольких реплик)."""
+        async for db in get_session():
+            # Лимит на пользователя считается по PROCESSING на момент запроса: без сериализации две реплики
+            # могли бы одновременно выдать одному пользователю по cap. Advisory-lock транзакции держится
+            # только на время одного UPDATE, следующий захват видит уже закоммиченные строки
+            if self.user_cap > 0:
+                await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(NOTIFY_CHANNEL))))
+
+            # WITH pool AS (... FOR UPDATE SKIP LOCKED) UPDATE ... WHERE id IN (справедливый top-N из pool)
+            rows = (await db.execute(
+                update(Request).where(Request.id.in_(self._fair_candidates(priority, count).scalar_subquery()))
+                .values(status=RequestStatus.PROCESSING, locked_at=datetime.now(), attempts=Request.attempts + 1)
+                .returning(
+                    Request.id, Request.user_id, Request.priority,
+                    Request.payload, Request.attempts, Request.created_at,
+                )
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+            return [Job(*row) for row in rows]
+        return []
+
+
+    async def count(self) -> Dict[Tuple[RequestStatus, RequestPriority], int]:
+        """Счетчики одним GROUP BY."""
+        async for db in get_session():
+            rows = (await db.execute(
+                select(Request.status, Request.priority, func.count(Request.id))
+                .group_by(Request.status, Request.priority)
+            )).all()
+            return {(RequestStatus(s), RequestPriority(p)): cnt for s, p, cnt in rows}
+        return {}
+
+
+    async def ack(self, done: List[UUID], failed: Dict[UUID, str], retry: Dict[UUID, Tuple[float, str]]) -> int:
+        """Один DELETE для выполненных и по UPDATE (executemany) для упавших и отложенных."""
+        async for db in get_session():
+            acked = 0
+            if done:
+                acked += (await db.execute(
+                    delete(Request).where(Request.id.in_(done))
+                    .execution_options(synchronize_session=False)
+                )).rowcount
+            if failed:
+                table = Request.__table__
+                acked += (await db.execute(
+                    update(table).where(table.c.id == bindparam("req_id"))
+                    .values(status=RequestStatus.FAILED, processed_at=datetime.now(), error=bindparam("req_error")),
+                    [{"req_id": req_id, "req_error": error} for req_id, error in failed.items()]
+                )).rowcount
+            if retry:
+                table, now = Request.__table__, datetime.now()
+                acked += (await db.execute(
+                    update(table).where(table.c.id == bindparam("req_id"))
+                    .values(
+                        status=RequestStatus.PENDING, locked_at=None,
+                        available_at=bindparam("req_at"), error=bindparam("req_error"),
+                    ),
+                    [
+                        {"req_id": req_id, "req_at": now + timedelta(seconds=delay), "req_error": error}
+                        for req_id, (delay, error) in retry.items()
+                    ]
+                )).rowcount
+            await db.commit()
+            return acked
+        return 0
+
+
+    async def renew(self, ids: List[UUID]) -> int:
+        """Продлевает аренду запросов, которые держит этот процесс."""
+        async for db in get_session():
+            result = await db.execute(
+                update(Request)
+                .where(Request.id.in_(ids), Request.status == RequestStatus.PROCESSING)
+                .values(locked_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount
+        return 0
+
+
+    async def release_expired(self) -> Tuple[int, List[Job]]:
+        """Возвращает в PENDING запросы с истекшей арендой, исчерпавшие попытки — в FAILED."""
+        exhausted = Request.attempts >= SETTINGS.QUEUE_MAX_ATTEMPTS
+        async for db in get_session():
+            rows = (await db.execute(
+                update(Request)
+                .where(
+                    Request.status == RequestStatus.PROCESSING,
+                    Request.locked_at < datetime.now() - timedelta(seconds=SETTINGS.QUEUE_LEASE_TIMEOUT)
+                )
+                .values(
+                    status=case((exhausted, RequestStatus.FAILED), else_=RequestStatus.PENDING),
+                    processed_at=case((exhausted, datetime.now()), else_=None),
+                    error=case((exhausted, "Истекла аренда запроса, попытки исчерпаны"), else_=Request.error),
+                    locked_at=None,
+                )
+                .returning(
+                    Request.status, Request.id, Request.user_id, Request.priority,
+                    Request.payload, Request.attempts, Request.created_at,
+                )
+                .execution_options(synchronize_session=False)
+            )).all()
+
+            if (requeued := sum(1 for row in rows if row[0] == RequestStatus.PENDING)):
+                await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, "requeue")))
+            await db.commit()
+            return requeued, [Job(*row[1:]) for row in rows if row[0] == RequestStatus.FAILED]
+        return 0, []
+
+
+    async def listen(self, on_notify: Callable[[Optional[str]], None]) -> None:
+        """Слушает NOTIFY о новых запросах на выделенном соединении."""
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(SETTINGS.POSTGRES_URL.replace("postgresql+asyncpg://", "postgresql://"))
+                await conn.add_listener(NOTIFY_CHANNEL, lambda _conn, _pid, _channel, payload: on_notify(payload))
+                logger.info(f"🚀 LISTEN {NOTIFY_CHANNEL}")
+
+                # Соединение могло пропустить NOTIFY пока переподключались
+                on_notify()
+                while True:
+                    await asyncio.sleep(SETTINGS.QUEUE_FALLBACK_POLL)
+                    await conn.execute("SELECT 1")  # Проверка живости, обрыв -> переподключение
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"🚀 Ошибка listener [{e.__class__.__name__}]: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if conn and not conn.is_closed():
+                    await conn.close()
+
+
+    async def cleanup(self, days: int) -> int:
+        """Удаляет старые завершенные/упавшие запросы."""
+        async for db in get_session():
+            result = await db.execute(
+                delete(Request).where(
+                    Request.status.in_([RequestStatus.COMPLETED, RequestStatus.FAILED]),
+                    Request.processed_at < datetime.now() - timedelta(days=days)
+                )
+            )
+            await db.commit()
+            return result.rowcount
+        return 0
+
+
+    async def list_dead(self, limit: int) -> List[DeadLetter]:
+        """Запросы в статусе FAILED, новые первыми."""
+        async for db in get_session():
+            reqs = (await db.execute(
+                select(Request).where(Request.status == RequestStatus.FAILED)
+                .order_by(Request.processed_at.desc()).limit(limit)
+            )).scalars().all()
+            return [
+                DeadLetter(
+                    id=req.id, user_id=req.user_id, priority=req.priority.value,
+                    attempts=req.attempts, error=req.error, processed_at=req.processed_at,
+                ) for req in reqs
+            ]
+        return []
+
+
+    def _dead(self, ids: Optional[List[UUID]]):
+        """Условие выборки из dead-letter."""
+        where = [Request.status == RequestStatus.FAILED]
+        if ids is not None:
+            where.append(Request.id.in_(ids))
+        return where
+
+
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """FAILED -> PENDING со сброшенным счетчиком попыток."""
+        async for db in get_session():
+            result = await db.execute(
+                update(Request).where(*self._dead(ids))
+                .values(
+                    status=RequestStatus.PENDING, attempts=0, error=None,
+                    processed_at=None, locked_at=None, available_at=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, "requeue")))
+            await db.commit()
+            return result.rowcount
+        return 0
+
+
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет запросы в статусе FAILED."""
+        async for db in get_session():
+            result = await db.execute(
+                delete(Request).where(*self._dead(ids))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount
+        return 0
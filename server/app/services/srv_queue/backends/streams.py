@@ -0,0 +1,346 @@
+# fmt: off
+# isort: off
+import os
+import json
+import time
+import socket
+import asyncio
+import redis.asyncio as redis
+
+from loguru import logger
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.storage import RequestStatus, RequestPriority
+from app.settings import SETTINGS
+from ..objects import DeadLetter, Job
+from .base import QueueBackend
+
+
+class RedisStreamsBackend(QueueBackend):
+    """Очередь на Redis Streams: XADD / XREADGROUP / XACK / XAUTOCLAIM.
+
+    По стриму на приоритет, одна consumer group на все реплики. Запросы не
+    пишутся в Postgres, упавшие (dead-letter) хранятся в хэше queue:failed:<priority>,
+    отложенные повторы — в sorted set queue:delayed:<priority> до наступления срока.
+    Лимит in-flight на пользователя не применяется — только чередование.
+    """
+
+    GROUP = "workers"
+    NOTIFY_CHANNEL = "queue:notify"
+
+    def __init__(self) -> None:
+        self._client: Optional[redis.Redis] = None
+        self._groups: Set[str] = set()
+        self._entries: Dict[UUID, Tuple[RequestPriority, bytes, Dict[bytes, bytes]]] = {}
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+
+    @property
+    async def client(self) -> redis.Redis:
+        """Клиент Redis (ленивая инициализация)."""
+        if not self._client:
+            self._client = redis.from_url(SETTINGS.REDIS_URL)
+        return self._client
+
+
+    @staticmethod
+    def _stream(priority: RequestPriority) -> str:
+        return f"queue:{priority.value}"
+
+
+    @staticmethod
+    def _failed_key(priority: RequestPriority) -> str:
+        return f"queue:failed:{priority.value}"
+
+
+    @staticmethod
+    def _delayed_key(priority: RequestPriority) -> str:
+        return f"queue:delayed:{priority.value}"
+
+
+    @staticmethod
+    def _dead_record(fields: Dict[bytes, bytes], error: str, processed_at: str) -> str:
+        """Запись dead-letter: исходные поля (для requeue) + ошибка."""
+        return json.dumps({
+            "fields": {k.decode(): v.decode() for k, v in fields.items()},
+            "error": error, "processed_at": processed_at,
+        }, ensure_ascii=False)
+
+
+    async def _ensure_groups(self, client: redis.Redis) -> None:
+        """Создает consumer group для всех стримов (один раз на процесс)."""
+        for priority in RequestPriority:
+            if (stream := self._stream(priority)) in self._groups:
+                continue
+            try:
+                await client.xgroup_create(stream, self.GROUP, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            self._groups.add(stream)
+
+
+    @staticmethod
+    def _to_job(fields: Dict[bytes, bytes]) -> Job:
+        """Собирает Job из полей записи стрима."""
+        f = {k.decode(): v.decode() for k, v in fields.items()}
+        return Job(
+            UUID(f["id"]), UUID(f["user_id"]), RequestPriority(f["priority"]),
+            json.loads(f["payload"]), int(f["attempts"]) + 1, datetime.fromisoformat(f["created_at"]),
+        )
+
+
+    async def enqueue(
+        self, db: AsyncSession, user_id: UUID, payload: Dict[str, Any], priority: RequestPriority
+    ) -> UUID:
+        """XADD в стрим приоритета + PUBLISH для пробуждения feeder'ов."""
+        client = await self.client
+        await self._ensure_groups(client)
+
+        req_id = uuid4()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.xadd(self._stream(priority), {
+                "id": str(req_id), "user_id": str(user_id), "priority": priority.value,
+                "payload": json.dumps(payload, ensure_ascii=False), "attempts": 0,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+            pipe.publish(self.NOTIFY_CHANNEL, priority.value)
+            await pipe.execute()
+        return req_id
+
+
+    async def claim(self, priority: RequestPriority, count: int) -> List[Job]:
+        """XREADGROUP новых записей: каждую запись группа выдает ровно одному consumer'у."""
+        client = await self.client
+        await self._ensure_groups(client)
+        await self._promote_delayed(client, priority, count)
+
+        jobs = []
+        for _, entries in await client.xreadgroup(
+            self.GROUP, self.consumer, {self._stream(priority): ">"}, count=count
+        ) or []:
+            for entry_id, fields in entries:
+                jobs.append(job := self._to_job(fields))
+                self._entries[job.id] = (priority, entry_id, fields)
+        return jobs
+
+
+    async def _promote_delayed(self, client: redis.Redis, priority: RequestPriority, count: int) -> None:
+        """Переносит в стрим отложенные повторы, срок которых наступил."""
+        key = self._delayed_key(priority)
+        if not (due := await client.zrangebyscore(key, 0, time.time(), start=0, num=count)):
+            return
+
+        async with client.pipeline(transaction=False) as pipe:
+            for member in due: pipe.zrem(key, member)
+            removed = await pipe.execute()
+
+        # ZREM вернул 1 только одной реплике — она и переносит запись
+        async with client.pipeline(transaction=False) as pipe:
+            for member, ok in zip(due, removed):
+                if ok: pipe.xadd(self._stream(priority), json.loads(member))
+            await pipe.execute()
+
+
+    async def count(self) -> Dict[Tuple[RequestStatus, RequestPriority], int]:
+        """PENDING = XLEN - PEL, PROCESSING = PEL (подтвержденные записи удаляются)."""
+        client = await self.client
+        await self._ensure_groups(client)
+
+        async with client.pipeline(transaction=False) as pipe:
+            for priority in RequestPriority:
+                pipe.xlen(self._stream(priority))
+                pipe.xpending(self._stream(priority), self.GROUP)
+                pipe.hlen(self._failed_key(priority))
+                pipe.zcard(self._delayed_key(priority))
+            results = await pipe.execute()
+
+        counts = {}
+        for i, priority in enumerate(RequestPriority):
+            length, pel, failed, delayed = results[i * 4:i * 4 + 4]
+            pel = pel["pending"]
+            counts[(RequestStatus.PENDING, priority)] = max(0, length - pel) + delayed
+            counts[(RequestStatus.PROCESSING, priority)] = pel
+            counts[(RequestStatus.FAILED, priority)] = failed
+        return counts
+
+
+    async def ack(self, done: List[UUID], failed: Dict[UUID, str], retry: Dict[UUID, Tuple[float, str]]) -> int:
+        """XACK + XDEL пачкой; упавшие — в queue:failed, повторы — в queue:delayed."""
+        client = await self.client
+        now = datetime.now(timezone.utc).isoformat()
+
+        acked = [req_id for req_id in [*done, *failed, *retry] if req_id in self._entries]
+        async with client.pipeline(transaction=False) as pipe:
+            for req_id in acked:
+                priority, entry_id, fields = self._entries[req_id]
+                pipe.xack(self._stream(priority), self.GROUP, entry_id)
+                pipe.xdel(self._stream(priority), entry_id)
+                if req_id in failed:
+                    pipe.hset(self._failed_key(priority), str(req_id), self._dead_record(fields, failed[req_id], now))
+                elif req_id in retry:
+                    delay, _ = retry[req_id]
+                    member = {k.decode(): v.decode() for k, v in fields.items()}
+                    member["attempts"] = str(int(member["attempts"]) + 1)
+                    pipe.zadd(self._delayed_key(priority), {json.dumps(member, ensure_ascii=False): time.time() + delay})
+            await pipe.execute()
+
+        for req_id in acked:
+            self._entries.pop(req_id, None)
+        return len(acked)
+
+
+    async def renew(self, ids: List[UUID]) -> int:
+        """XCLAIM JUSTID на себя с min-idle 0 — сбрасывает idle записей в PEL."""
+        by_priority: Dict[RequestPriority, List[bytes]] = {}
+        for req_id in ids:
+            if (entry := self._entries.get(req_id)):
+                by_priority.setdefault(entry[0], []).append(entry[1])
+        if not by_priority:
+            return 0
+
+        client = await self.client
+        async with client.pipeline(transaction=False) as pipe:
+            for priority, entry_ids in by_priority.items():
+                pipe.xclaim(self._stream(priority), self.GROUP, self.consumer, 0, entry_ids, justid=True)
+            return sum(len(r) for r in await pipe.execute())
+
+
+    async def release_expired(self) -> Tuple[int, List[Job]]:
+        """XAUTOCLAIM зависших записей: переотправка копией (attempts+1) или в failed."""
+        client = await self.client
+        await self._ensure_groups(client)
+        requeued, failed = 0, []
+        now = datetime.now(timezone.utc).isoformat()
+
+        for priority in RequestPriority:
+            stream, start = self._stream(priority), "0-0"
+            while True:
+                resp = await client.xautoclaim(
+                    stream, self.GROUP, self.consumer,
+                    SETTINGS.QUEUE_LEASE_TIMEOUT * 1000, start_id=start, count=100
+                )
+                start, entries = resp[0], resp[1]
+
+                async with client.pipeline(transaction=False) as pipe:
+                    for entry_id, fields in entries:
+                        pipe.xack(stream, self.GROUP, entry_id)
+                        pipe.xdel(stream, entry_id)
+                        if not fields:
+                            continue
+
+                        if (attempts := int(fields[b"attempts"]) + 1) >= SETTINGS.QUEUE_MAX_ATTEMPTS:
+                            pipe.hset(self._failed_key(priority), fields[b"id"], self._dead_record(
+                                fields, "Истекла аренда запроса, попытки исчерпаны", now
+                            ))
+                            failed.append(self._to_job(fields))
+                        else:
+                            pipe.xadd(stream, {**fields, b"attempts": attempts})
+                            requeued += 1
+                    await pipe.execute()
+
+                if start in (b"0-0", "0-0"):
+                    break
+
+        if requeued:
+            await client.publish(self.NOTIFY_CHANNEL, "requeue")
+        return requeued, failed
+
+
+    async def listen(self, on_notify: Callable[[Optional[str]], None]) -> None:
+        """SUBSCRIBE на канал уведомлений о новых запросах."""
+        while True:
+            pubsub = None
+            try:
+                pubsub = (await self.client).pubsub()
+                await pubsub.subscribe(self.NOTIFY_CHANNEL)
+                logger.info(f"🚀 SUBSCRIBE {self.NOTIFY_CHANNEL}")
+
+                on_notify()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        on_notify(message["data"].decode("utf-8"))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"🚀 Ошибка listener [{e.__class__.__name__}]: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub:
+                    await pubsub.close()
+
+
+    async def cleanup(self, days: int) -> int:
+        """Удаляет записи об упавших запросах старше days."""
+        client = await self.client
+        threshold = datetime.now(timezone.utc) - timedelta(days=days)
+        removed = 0
+        for priority in RequestPriority:
+            key = self._failed_key(priority)
+            if (old := [
+                req_id for req_id, raw in (await client.hgetall(key)).items()
+                if datetime.fromisoformat(json.loads(raw)["processed_at"]) < threshold
+            ]):
+                removed += await client.hdel(key, *old)
+        return removed
+
+
+    async def list_dead(self, limit: int) -> List[DeadLetter]:
+        """Записи dead-letter всех приоритетов, новые первыми."""
+        client = await self.client
+        dead = []
+        for priority in RequestPriority:
+            for raw in (await client.hgetall(self._failed_key(priority))).values():
+                record = json.loads(raw)
+                dead.append(DeadLetter(
+                    id=UUID(record["fields"]["id"]), user_id=UUID(record["fields"]["user_id"]),
+                    priority=priority.value, attempts=int(record["fields"]["attempts"]) + 1,
+                    error=record["error"], processed_at=datetime.fromisoformat(record["processed_at"]),
+                ))
+        return sorted(dead, key=lambda d: d.processed_at, reverse=True)[:limit]
+
+
+    async def _take_dead(self, client: redis.Redis, ids: Optional[List[UUID]]) -> List[Tuple[RequestPriority, Dict[str, str]]]:
+        """Забирает записи из dead-letter (HDEL), возвращает их исходные поля."""
+        taken = []
+        for priority in RequestPriority:
+            key = self._failed_key(priority)
+            records = await client.hgetall(key)
+            if ids is not None:
+                wanted = {str(req_id).encode() for req_id in ids}
+                records = {k: v for k, v in records.items() if k in wanted}
+            for req_id, raw in records.items():
+                if await client.hdel(key, req_id):
+                    taken.append((priority, json.loads(raw)["fields"]))
+        return taken
+
+
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Возвращает записи dead-letter в стрим со сброшенным счетчиком попыток."""
+        client = await self.client
+        await self._ensure_groups(client)
+        if not (taken := await self._take_dead(client, ids)):
+            return 0
+
+        async with client.pipeline(transaction=False) as pipe:
+            for priority, fields in taken:
+                pipe.xadd(self._stream(priority), {**fields, "attempts": 0})
+            pipe.publish(self.NOTIFY_CHANNEL, "requeue")
+            await pipe.execute()
+        return len(taken)
+
+
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет записи dead-letter."""
+        return len(await self._take_dead(await self.client, ids))
+
+
+    async def close(self) -> None:
+        """Закрывает соединение."""
+        if self._client:
+            await self._client.close()
+            self._client = None
@@ -1,84 +1,281 @@
 # fmt: off
 # isort: off
+import time
 import asyncio
+
 from uuid import UUID
+from collections import Counter
 from loguru import logger
-from datetime import datetime, timedelta
-from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any, Dict, Callable, Awaitable, List
+from typing import Any, Dict, Callable, Awaitable, List, Optional, Tuple, Set
 
-from app.storage import RequestStatus, RequestPriority, Request, get_session
-from .objects import QueueStats
+from app.storage import RequestStatus, RequestPriority
+from app.settings import SETTINGS
+from .objects import QueueStats, PoolState, DeadLetter, Job
+from .backends import QueueBackend, get_backend
+from .retry import RequestCancelled, should_retry, backoff
+from .autoscale import WorkerAutoscaler
+from .acks import AckBuffer
 
 
 class QueueManager:
     """Менеджер очереди запросов."""
 
-    def __init__(self, ratio=(1, 2), workers=50, batch=100):
-        self.tasks = []
+    def __init__(self, ratio=(1, 2), workers=None, batch=None, backend: Optional[QueueBackend] = None):
+        workers = workers or SETTINGS.QUEUE_WORKERS
+        batch = batch or SETTINGS.QUEUE_BATCH
+
+        self.backend = backend or get_backend(SETTINGS.QUEUE_BACKEND)
+        self.tasks: Dict[int, asyncio.Task] = {}
         self.batch = batch
+        self.scaler = None
+        self.handler = None
+        self.on_drop: Optional[Callable[[Job], Awaitable[None]]] = None
         self.feeder = None
+        self.listener = None
+        self.reaper = None
         self.ratio = ratio
         self.running = False
-        self.workers = workers
-        self.queue = asyncio.Queue()
+        # Граница на случай гонок; обычно feeder сам не берет больше, чем есть места (_room)
+        self.queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=SETTINGS.QUEUE_WORKERS_MAX + SETTINGS.QUEUE_PREFETCH)
         self._ratio_counter = 0
-        logger.info(f"🚀 QueueManager: {workers} workers, batch={batch}, ratio={ratio}")
+        self._wakeup = asyncio.Event()
+        self._counts: Optional[Dict[Tuple[RequestStatus, RequestPriority], int]] = None
+        self._counts_at = 0.0
+        self._counts_gen = 0
+        self._counts_notes: Optional[Counter] = None  # Новые запросы, пришедшие во время пересчета
+        self._inflight: Set[UUID] = set()
+        self._running: Dict[UUID, asyncio.Task] = {}
+        self._busy = 0
+        self._next_wid = 0
+        self.autoscaler = WorkerAutoscaler(workers, SETTINGS.QUEUE_WORKERS_MIN, SETTINGS.QUEUE_WORKERS_MAX)
+        # После записи подтверждений освобождаются слоты пользователей — будим feeder
+        self.acks = AckBuffer(
+            self.backend.ack, SETTINGS.QUEUE_ACK_INTERVAL, SETTINGS.QUEUE_ACK_BATCH, on_flush=self._wakeup.set
+        )
+        logger.info(f"🚀 QueueManager: {workers} workers, batch={batch}, ratio={ratio}, backend={self.backend.__class__.__name__}")
 
 
     async def _shutdown(self) -> None:
         """Завершает работу очереди."""
         self.running = False
-        if self.feeder and not self.feeder.done():
-            self.feeder.cancel()
+        for task in (self.feeder, self.listener, self.reaper, self.scaler):
+            if task and not task.done():
+                task.cancel()
 
-        for task in self.tasks:
+        for task in self.tasks.values():
             if not task.done():
                 task.cancel()
 
         if self.tasks:
             await asyncio.gather(
-                *self.tasks,
+                *self.tasks.values(),
                 return_exceptions=True
             )
+        self.tasks.clear()
+        await self.acks.stop()
+        await self.backend.close()
+
+
+    def _on_notify(self, payload: Optional[str] = None) -> None:
+        """Появились новые запросы, будим feeder. Уведомление с приоритетом — инкремент снимка счетчиков
+        (без пересчета на каждый enqueue); requeue/переподключение — снимок устарел целиком."""
+        try:
+            priority = RequestPriority(payload)
+        except ValueError:
+            self._counts, self._counts_gen = None, self._counts_gen + 1
+        else:
+            key = (RequestStatus.PENDING, priority)
+            if self._counts is not None:
+                self._counts[key] = self._counts.get(key, 0) + 1
+            if self._counts_notes is not None:
+                self._counts_notes[priority] += 1
+        self._wakeup.set()
+
+
+    async def _listen(self) -> None:
+        """Слушает уведомления бэкенда о новых запросах и будит feeder."""
+        await self.backend.listen(self._on_notify)
 
 
     async def _feed(self) -> None:
         """Подает запросы в очередь."""
         while self.running:
+            self._wakeup.clear()
+            fetched = 0
             try:
-                if self.queue.qsize() < self.batch:
-                    async for db in get_session():
-                        if (reqs := await self._get_batch(db)):
-                            logger.info(f"🚀 Подхвачено {len(reqs)} запросов")
-                            for req in reqs: await self.queue.put(req)
-                        break
+                if (room := self._room()) > 0 and (jobs := await self._get_batch(room)):
+                    logger.info(f"🚀 Подхвачено {len(jobs)} запросов")
+                    self._inflight.update(job.id for job in jobs)
+                    for job in jobs: await self.queue.put(job)
+                    fetched = len(jobs)
             except Exception as e:
                 logger.error(f"🚀 Ошибка feeder [{e.__class__.__name__}]: {e}")
-            await asyncio.sleep(1)
+
+            # Есть бэклог — короткая пауза, иначе ждем уведомления (с редким опросом на всякий случай)
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=SETTINGS.QUEUE_BUSY_POLL if fetched else SETTINGS.QUEUE_FALLBACK_POLL
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+    def _room(self) -> int:
+        """Сколько можно захватить: свободные воркеры + QUEUE_PREFETCH минус уже ожидающие в очереди."""
+        return len(self.tasks) - self._busy + SETTINGS.QUEUE_PREFETCH - self.queue.qsize()
 
 
-    async def _process(self, db: AsyncSession, req: Request, handler: Callable, wid: int) -> None:
+    async def _process(self, req: Job, handler: Callable, wid: int) -> None:
         """Обрабатывает один запрос."""
         logger.info(f"🚀 [W{wid}] {req.id}")
+        started = time.monotonic()
+        self._busy += 1
         try:
-            await handler(req)
-            await self.complete_request(db, req.id)
+            await self._run(req, handler)
+            self.autoscaler.observe(time.monotonic() - started)
+            self.acks.complete(req.id)
+        except RequestCancelled as e:
+            # Ответ никому не нужен: не ошибка провайдера (мимо автоскейлера) и не dead-letter
+            logger.info(f"🚀 [W{wid}] {req.id} снят: {e}")
+            self.acks.complete(req.id)
+            await self._drop(req)
         except Exception as e:
-            logger.error(f"🚀 [W{wid}] Ошибка {req.id} [{e.__class__.__name__}]: {e}")
-            await self.fail_request(db, req.id, f"[{e.__class__.__name__}] {e}")
+            error = f"[{e.__class__.__name__}] {e}"
+            self.autoscaler.observe(time.monotonic() - started, e)
+            if should_retry(e, req.attempts):
+                delay = backoff(req.attempts)
+                logger.warning(f"🚀 [W{wid}] Повтор {req.id} через {delay:.1f}с (попытка {req.attempts}): {error}")
+                self.acks.retry(req.id, delay, error)
+                asyncio.get_running_loop().call_later(delay, self._on_notify, req.priority.value)
+            else:
+                logger.error(f"🚀 [W{wid}] Ошибка {req.id} {error}")
+                self.acks.fail(req.id, error)
+                await self._drop(req)
+        finally:
+            self._busy -= 1
+            self._inflight.discard(req.id)
+            # Освободился воркер, а запас в очереди на исходе — подкачиваем, не дожидаясь подтверждений
+            if self.queue.qsize() < SETTINGS.QUEUE_PREFETCH:
+                self._wakeup.set()
 
 
-    async def process_queue(self, handler: Callable[[Request], Awaitable[bool]]) -> None:
-        """Запускает обработку очереди."""
+    async def _drop(self, job: Job) -> None:
+        """Запрос снят без выполнения (отмена, дедлайн, dead-letter) — хук владельца очереди."""
+        if not self.on_drop:
+            return
         try:
-            logger.info(f"🚀 Запуск {self.workers} воркеров")
-            self.tasks = [asyncio.create_task(self._worker(i, handler)) for i in range(self.workers)]
-            self.feeder = asyncio.create_task(self._feed())
+            await self.on_drop(job)
+        except Exception as e:
+            logger.error(f"🚀 Ошибка on_drop для {job.id} [{e.__class__.__name__}]: {e}")
+
+
+    async def _run(self, job: Job, handler: Callable) -> None:
+        """Запускает обработчик отдельной задачей, которую снимают отмена клиента или дедлайн."""
+        if job.deadline and time.time() >= job.deadline:
+            raise RequestCancelled("Истек дедлайн до начала обработки")
+
+        task = asyncio.create_task(handler(job))
+        self._running[job.id] = task
+        try:
+            done, _ = await asyncio.wait({task}, timeout=job.deadline - time.time() if job.deadline else None)
+            if not done:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise RequestCancelled("Истек дедлайн запроса")
+            if task.cancelled():
+                raise RequestCancelled("Запрос отменен клиентом")
+            task.result()
+        finally:
+            self._running.pop(job.id, None)
+            if not task.done():
+                task.cancel()
+
+
+    def cancel(self, req_id: UUID) -> bool:
+        """Отменяет обработку запроса, если он выполняется в этом процессе."""
+        if (task := self._running.get(req_id)) and not task.done():
+            task.cancel()
+            return True
+        return False
+
+
+    async def _reap(self) -> None:
+        """Продлевает свои аренды и освобождает зависшие PROCESSING запросы."""
+        while self.running:
+            await asyncio.sleep(SETTINGS.QUEUE_LEASE_HEARTBEAT)
+            try:
+                if self._inflight:
+                    await self.backend.renew(list(self._inflight))
+                requeued, failed = await self.backend.release_expired()
+                if requeued or failed:
+                    logger.warning(f"🚀 Истекла аренда: возвращено {requeued}, провалено {len(failed)}")
+                for job in failed:
+                    await self._drop(job)
+            except Exception as e:
+                logger.error(f"🚀 Ошибка reaper [{e.__class__.__name__}]: {e}")
+
+
+    def _resize(self, target: int) -> None:
+        """Доводит число воркеров до target: лишние завершатся после текущего запроса."""
+        while len(self.tasks) < target:
+            wid, self._next_wid = self._next_wid, self._next_wid + 1
+            self.tasks[wid] = asyncio.create_task(self._worker(wid, self.handler))
 
+
+    def _backlog(self) -> int:
+        """Ожидающие запросы: локальная очередь + PENDING из снимка счетчиков."""
+        return self.queue.qsize() + sum(
+            cnt for (st, _), cnt in (self._counts or {}).items() if st == RequestStatus.PENDING
+        )
+
+
+    async def _scale(self) -> None:
+        """Периодически пересчитывает размер пула воркеров."""
+        while self.running:
+            await asyncio.sleep(SETTINGS.QUEUE_AUTOSCALE_INTERVAL)
+            try:
+                backlog = self._backlog()
+                prev = len(self.tasks)
+                target = self.autoscaler.decide(backlog, self._busy)
+                self._resize(target)
+                if target != prev:
+                    logger.info(f"🚀 Пул воркеров: {prev} -> {target} (backlog={backlog})")
+            except Exception as e:
+                logger.error(f"🚀 Ошибка autoscaler [{e.__class__.__name__}]: {e}")
+
+
+    def get_pool_state(self) -> PoolState:
+        """Состояние пула воркеров."""
+        return self.autoscaler.state(len(self.tasks), self._backlog())
+
+
+    def configure_pool(self, **kwargs) -> PoolState:
+        """Ручная настройка пула (границы, фиксированный размер, авто)."""
+        self.autoscaler.configure(**kwargs)
+        if self.running:
+            self._resize(self.autoscaler.target)
+        return self.get_pool_state()
+
+
+    async def process_queue(
+        self, handler: Callable[[Job], Awaitable[bool]], on_drop: Optional[Callable[[Job], Awaitable[None]]] = None
+    ) -> None:
+        """Запускает обработку очереди. on_drop — для запросов, снятых без выполнения (освободить их ресурсы)."""
+        try:
+            logger.info(f"🚀 Запуск {self.autoscaler.target} воркеров")
             self.running = True
-            await asyncio.gather(self.feeder, *self.tasks)
+            self.handler = handler
+            self.on_drop = on_drop
+            self._resize(self.autoscaler.target)
+            self.feeder = asyncio.create_task(self._feed())
+            self.listener = asyncio.create_task(self._listen())
+            self.reaper = asyncio.create_task(self._reap())
+            self.scaler = asyncio.create_task(self._scale())
+            self.acks.start()
+
+            await asyncio.gather(self.feeder, self.listener, self.reaper, self.scaler)
 
         except Exception as e:
             logger.error(f"🚀 Ошибка очереди [{e.__class__.__name__}]: {e}")
@@ -91,26 +288,48 @@ class QueueManager:
         priority: RequestPriority = RequestPriority.GENERAL,
     ) -> UUID:
         """Добавляет запрос в очередь."""
-        db.add(req := Request(
-            user_id=user_id,
-            priority=priority,
-            payload=payload,
-        ))
-        await db.commit()
-        return req.id
-
-
-    async def _get_batch(self, db: AsyncSession) -> List[Request]:
-        """Получает пачку запросов для обработки."""
-        g_cnt = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.PENDING,
-            Request.priority == RequestPriority.GENERAL
-        ))
-        p_cnt = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.PENDING,
-            Request.priority == RequestPriority.PREMIUM
-        ))
-        if not (g_cnt := g_cnt or 0) and not (p_cnt := p_cnt or 0):
+        return await self.backend.enqueue(db, user_id, payload, priority)
+
+
+    async def _get_counts(self) -> Dict[Tuple[RequestStatus, RequestPriority], int]:
+        """Счетчики запросов по (статус, приоритет) — один запрос к бэкенду, кэш на QUEUE_STATS_TTL."""
+        if self._counts is not None and time.monotonic() - self._counts_at <= SETTINGS.QUEUE_STATS_TTL:
+            return self._counts
+
+        gen, self._counts_notes = self._counts_gen, Counter()
+        try:
+            counts = await self.backend.count()
+        finally:
+            notes, self._counts_notes = self._counts_notes, None
+
+        # Новые запросы во время пересчета добавляем сверху: лишний учет безопасен (захват вернет меньше
+        # и обнулит счетчик), пропуск — нет. Пока шел запрос снимок сбросили — результат не кэшируем
+        for priority, added in notes.items():
+            counts[(RequestStatus.PENDING, priority)] = counts.get((RequestStatus.PENDING, priority), 0) + added
+        if gen == self._counts_gen:
+            self._counts, self._counts_at = counts, time.monotonic()
+        return counts
+
+
+    def _apply_claim(self, priority: RequestPriority, requested: int, claimed: int) -> None:
+        """Обновляет снимок счетчиков после захвата пачки без запроса в БД."""
+        if self._counts is None:
+            return
+        pending, processing = (RequestStatus.PENDING, priority), (RequestStatus.PROCESSING, priority)
+
+        # Захватили меньше, чем просили — свободных PENDING больше нет (если нет лимита на
+        # пользователя: тогда остаток может ждать освобождения слотов)
+        exhausted = claimed < requested and self.backend.user_cap <= 0
+        self._counts[pending] = 0 if exhausted else max(0, self._counts.get(pending, 0) - claimed)
+        self._counts[processing] = self._counts.get(processing, 0) + claimed
+
+
+    async def _get_batch(self, limit: int) -> List[Job]:
+        """Получает пачку запросов для обработки (не больше limit)."""
+        counts = await self._get_counts()
+        g_cnt = counts.get((RequestStatus.PENDING, RequestPriority.GENERAL), 0)
+        p_cnt = counts.get((RequestStatus.PENDING, RequestPriority.PREMIUM), 0)
+        if not g_cnt and not p_cnt:
             return []
 
         # Соотношение 1:2 с ротацией
@@ -120,67 +339,50 @@ class QueueManager:
         else: is_general = not p_cnt
 
         priority = RequestPriority.GENERAL if is_general else RequestPriority.PREMIUM
-        size = min(self.batch, g_cnt if is_general else p_cnt)
+        size = min(self.batch, limit, g_cnt if is_general else p_cnt)
 
         logger.info(f"🚀 Доступно: general={g_cnt}, premium={p_cnt}, выбрано: {priority.value}={size}")
-        return await self._lock_batch(db, priority, size)
+        # Бэкенд не гарантирует порядок внутри пачки
+        jobs = self._interleave(await self.backend.claim(priority, size))
+        self._apply_claim(priority, size, len(jobs))
+        return jobs
 
 
-    async def _lock_batch(self, db: AsyncSession, priority: RequestPriority, count: int) -> List[Request]:
-        """Блокирует пачку запросов для обработки."""
-        if not (reqs := list((await db.execute(select(Request).where(
-            Request.status == RequestStatus.PENDING,
-            Request.priority == priority
-        ).order_by(Request.created_at).limit(count))).scalars().all())):
-            return []
+    @staticmethod
+    def _interleave(jobs: List[Job]) -> List[Job]:
+        """Чередует запросы разных пользователей в локальной очереди."""
+        by_user: Dict[UUID, List[Job]] = {}
+        for job in sorted(jobs, key=lambda j: j.created_at):
+            by_user.setdefault(job.user_id, []).append(job)
 
-        now = datetime.now()
-        await db.execute(
-            update(Request).where(Request.id.in_([r.id for r in reqs]))
-            .values(status=RequestStatus.PROCESSING, locked_at=now)
-        )
-        await db.commit()
-
-        for r in reqs:
-            r.status = RequestStatus.PROCESSING
-            r.locked_at = now
-        return reqs
+        result = []
+        while by_user:
+            for user_id in list(by_user):
+                result.append(by_user[user_id].pop(0))
+                if not by_user[user_id]: del by_user[user_id]
+        return result
 
 
     async def complete_request(self, db: AsyncSession, req_id: UUID) -> bool:
-        """Удаляет успешно выполненный запрос."""
-        if req := await db.get(Request, req_id):
-            await db.delete(req)
-            await db.commit()
-            return True
-        return False
+        """Подтверждает успешно выполненный запрос."""
+        return await self.backend.ack([req_id], {}, {}) > 0
 
 
     async def fail_request(self, db: AsyncSession, req_id: UUID, error: str) -> bool:
         """Отмечает запрос как неудачный."""
-        result = await db.execute(
-            update(Request)
-            .where(Request.id == req_id)
-            .values(
-                status=RequestStatus.FAILED,
-                processed_at=datetime.now(),
-                error=error
-            )
-        )
-        await db.commit()
-        return result.rowcount > 0
+        return await self.backend.ack([], {req_id: error}, {}) > 0
 
 
-    async def _worker(self, wid: int, handler: Callable[[Request], Awaitable[bool]]) -> None:
+    async def _worker(self, wid: int, handler: Callable[[Job], Awaitable[bool]]) -> None:
         """Воркер для обработки запросов."""
-        from app.storage import get_session
-
         while self.running:
+            # Пул сжали — лишний воркер выходит между запросами
+            if len(self.tasks) > self.autoscaler.target:
+                self.tasks.pop(wid, None)
+                return
             try:
                 req = await asyncio.wait_for(self.queue.get(), timeout=1.0)
-                async for db in get_session():
-                    await self._process(db, req, handler, wid)
-                    break
+                await self._process(req, handler, wid)
                 self.queue.task_done()
 
             except asyncio.TimeoutError:
@@ -193,49 +395,38 @@ class QueueManager:
 
     async def cleanup_completed(self, db: AsyncSession, days: int = 7) -> int:
         """Удаляет старые завершенные запросы."""
-        threshold = datetime.now() - timedelta(days=days)
-        result = await db.execute(
-            select(Request).where(
-                Request.status.in_([
-                    RequestStatus.COMPLETED,
-                    RequestStatus.FAILED]),
-                Request.processed_at < threshold
-            )
-        )
+        return await self.backend.cleanup(days)
+
+
+    async def list_dead(self, limit: int = 50) -> List[DeadLetter]:
+        """Запросы в dead-letter."""
+        return await self.backend.list_dead(limit)
+
+
+    async def requeue_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Возвращает запросы из dead-letter в очередь."""
+        if (count := await self.backend.requeue_dead(ids)):
+            self._on_notify()
+        return count
 
-        reqs = result.scalars().all()
-        for req in reqs:
-            await db.delete(req)
 
-        await db.commit()
-        return len(reqs)
+    async def purge_dead(self, ids: Optional[List[UUID]] = None) -> int:
+        """Удаляет запросы из dead-letter."""
+        if (count := await self.backend.purge_dead(ids)):
+            self._counts = None
+        return count
 
 
     async def get_queue_stats(self, db: AsyncSession) -> QueueStats:
-        """Получает статистику очереди."""
-        general_pending = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.PENDING,
-            Request.priority == RequestPriority.GENERAL
-        ))
-        premium_pending = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.PENDING,
-            Request.priority == RequestPriority.PREMIUM
-        ))
-        processing = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.PROCESSING
-        ))
-        completed = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.COMPLETED
-        ))
-        failed = await db.scalar(select(func.count(Request.id)).where(
-            Request.status == RequestStatus.FAILED
-        ))
+        """Получает статистику очереди (из того же снимка, что и feeder)."""
+        counts = await self._get_counts()
+        total = lambda status: sum(cnt for (s, _), cnt in counts.items() if s == status)
         return QueueStats(
             pending={
-                "general": general_pending or 0,
-                "premium": premium_pending or 0
+                "general": counts.get((RequestStatus.PENDING, RequestPriority.GENERAL), 0),
+                "premium": counts.get((RequestStatus.PENDING, RequestPriority.PREMIUM), 0)
             },
-            processing=processing or 0,
-            completed=completed or 0,
-            failed=failed or 0,
+            processing=total(RequestStatus.PROCESSING),
+            completed=total(RequestStatus.COMPLETED),
+            failed=total(RequestStatus.FAILED),
         )
@@ -1,7 +1,36 @@
 # fmt: off
 # isort: off
-from typing import Dict
+from uuid import UUID
+from datetime import datetime
 from pydantic import BaseModel
+from typing import Any, Dict, Optional
+
+from app.storage import RequestPriority
+
+
+class Job:
+    """Захваченный запрос в локальной очереди: только то, что нужно обработчику, без ORM."""
+
+    __slots__ = ("id", "user_id", "priority", "payload", "attempts", "created_at")
+
+    def __init__(
+        self, id: UUID, user_id: UUID, priority: RequestPriority,
+        payload: Dict[str, Any], attempts: int, created_at: datetime,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.priority = priority
+        self.payload = payload
+        self.attempts = attempts
+        self.created_at = created_at
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Unix-время, после которого результат никому не нужен (кладет API в payload)."""
+        return self.payload.get("deadline")
+
+    def __repr__(self) -> str:
+        return f"Job({self.id}, {self.priority.value}, attempt={self.attempts})"
 
 
 class QueueStats(BaseModel):
@@ -9,4 +38,29 @@ class QueueStats(BaseModel):
     pending: Dict[str, int]
     processing: int
     completed: int
-    failed: int
\ No newline at end of file
+    failed: int
+
+
+class PoolState(BaseModel):
+    """Состояние пула воркеров."""
+    active: int
+    target: int
+    backlog: int
+    min_workers: int
+    max_workers: int
+    auto: bool
+    throughput: float
+    latency: float
+    error_ratio: float
+    throttle_ratio: float
+    processes: int = 1
+
+
+class DeadLetter(BaseModel):
+    """Запрос в dead-letter (FAILED): попытки исчерпаны или ошибка неповторяемая."""
+    id: UUID
+    user_id: UUID
+    priority: str
+    attempts: int
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
@@ -0,0 +1,98 @@
+# fmt: off
+# isort: off
+import asyncio
+
+from uuid import uuid4
+from loguru import logger
+from typing import Any, Dict, List, Optional
+
+from app.settings import SETTINGS
+from .objects import PoolState
+from .manager import QueueManager
+
+
+class PoolCoordinator:
+    """Настройка и состояние пулов воркеров всех процессов через Redis.
+
+    API-процесс своих воркеров не запускает: ручная настройка пишется в Redis, воркеры применяют ее на
+    каждом шаге автоскейлера и публикуют свое состояние (с TTL), а API собирает его в одно.
+    """
+
+    def __init__(self, manager: QueueManager):
+        self._manager = manager
+        self._id = uuid4().hex
+        self._applied: Optional[Dict[str, Any]] = None
+
+
+    async def run(self) -> None:
+        """Синхронизация пула этого процесса с Redis, пока идет обработка очереди."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"🚀 Ошибка синхронизации пула [{e.__class__.__name__}]: {e}")
+            await asyncio.sleep(SETTINGS.QUEUE_AUTOSCALE_INTERVAL)
+
+
+    async def sync(self) -> None:
+        """Применяет новую настройку из Redis и публикует состояние пула."""
+        from app.services import get_service
+        if (config := await get_service.redis.get_pool_config()) != self._applied:
+            workers = config.get("workers")
+            self._manager.configure_pool(
+                workers=workers, auto=workers is None,
+                min_workers=config.get("min_workers"), max_workers=config.get("max_workers"),
+            )
+            self._applied = config
+            logger.info(f"🚀 Применена настройка пула: {config}")
+        await get_service.redis.report_pool_state(
+            self._id, self._manager.get_pool_state().model_dump(), int(SETTINGS.QUEUE_AUTOSCALE_INTERVAL * 3)
+        )
+
+
+    @staticmethod
+    async def configure(
+        workers: Optional[int] = None, min_workers: Optional[int] = None,
+        max_workers: Optional[int] = None, auto: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Сохраняет ручную настройку для всех воркеров (та же семантика, что у WorkerAutoscaler.configure)."""
+        from app.services import get_service
+        config = await get_service.redis.get_pool_config()
+        if min_workers is not None: config["min_workers"] = min_workers
+        if max_workers is not None: config["max_workers"] = max_workers
+        if workers is not None: config["workers"] = workers
+        if auto: config.pop("workers", None)
+        await get_service.redis.set_pool_config(config)
+        return config
+
+
+    @staticmethod
+    async def state() -> PoolState:
+        """Сводное состояние пулов всех живых процессов-воркеров."""
+        from app.services import get_service
+        states: List[PoolState] = [PoolState(**s) for s in await get_service.redis.get_pool_states()]
+        if not states:
+            config = await get_service.redis.get_pool_config()
+            return PoolState(
+                active=0, target=0, backlog=0, processes=0, auto="workers" not in config,
+                min_workers=config.get("min_workers", SETTINGS.QUEUE_WORKERS_MIN),
+                max_workers=config.get("max_workers", SETTINGS.QUEUE_WORKERS_MAX),
+                throughput=0.0, latency=0.0, error_ratio=0.0, throttle_ratio=0.0,
+            )
+
+        # Доли и латентность — средние, взвешенные по пропускной способности процесса
+        throughput = sum(s.throughput for s in states)
+        weights = [s.throughput / throughput for s in states] if throughput else [1 / len(states)] * len(states)
+        return PoolState(
+            active=sum(s.active for s in states),
+            target=sum(s.target for s in states),
+            backlog=max(s.backlog for s in states),  # Бэклог общий: каждый процесс видит всю очередь
+            processes=len(states),
+            min_workers=states[0].min_workers,
+            max_workers=states[0].max_workers,
+            auto=all(s.auto for s in states),
+            throughput=round(throughput, 3),
+            latency=round(sum(w * s.latency for w, s in zip(weights, states)), 3),
+            error_ratio=round(sum(w * s.error_ratio for w, s in zip(weights, states)), 3),
+            throttle_ratio=round(sum(w * s.throttle_ratio for w, s in zip(weights, states)), 3),
+        )
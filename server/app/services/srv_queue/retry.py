@@ -0,0 +1,75 @@
+# fmt: off
+# isort: off
+import random
+import asyncio
+
+from typing import Iterator, Optional
+
+from app.settings import SETTINGS
+
+
+class NonRetryableError(Exception):
+    """Ошибка, после которой запрос нельзя повторять (например, ответ уже частично отдан клиенту)."""
+
+
+class RequestCancelled(NonRetryableError):
+    """Запрос отменен клиентом или истек его дедлайн."""
+
+
+# Транзиентные ошибки провайдеров и сети (openai / httpx), сравниваются по имени класса
+_RETRYABLE_NAMES = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "ReadError", "RemoteProtocolError",
+}
+_RETRYABLE_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def _chain(error: Optional[BaseException]) -> Iterator[BaseException]:
+    """Ошибка и ее причины: провайдеры заворачивают настоящую ошибку (APIKeyManager — в "All API keys failed")."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def _status(error: BaseException) -> Optional[int]:
+    """HTTP-статус ошибки провайдера: status_code у openai / httpx, code у google-genai."""
+    return getattr(error, "status_code", None) or getattr(error, "code", None)
+
+
+def _is_transient(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if error.__class__.__name__ in _RETRYABLE_NAMES:
+        return True
+    return _status(error) in _RETRYABLE_CODES
+
+
+def is_retryable(error: Optional[BaseException]) -> bool:
+    """Транзиентная ли ошибка (проверяется вся цепочка причин)."""
+    for cause in _chain(error):
+        if isinstance(cause, (NonRetryableError, ValueError)):
+            return False
+        if _is_transient(cause):
+            return True
+    return False
+
+
+def is_throttled(error: Optional[BaseException]) -> bool:
+    """Отказ провайдера по лимитам (429) где-либо в цепочке причин."""
+    return any(
+        cause.__class__.__name__ == "RateLimitError" or _status(cause) == 429
+        for cause in _chain(error)
+    )
+
+
+def should_retry(error: BaseException, attempts: int) -> bool:
+    """Повторять ли запрос после attempts попыток."""
+    return attempts < SETTINGS.QUEUE_MAX_ATTEMPTS and is_retryable(error)
+
+
+def backoff(attempts: int) -> float:
+    """Задержка перед повтором: экспонента с равномерным джиттером в [d/2, d]."""
+    delay = min(SETTINGS.QUEUE_RETRY_MAX_DELAY, SETTINGS.QUEUE_RETRY_BASE * 2 ** max(0, attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -1,6 +1,7 @@
 # fmt: off
 # isort: off
 from loguru import logger
+from .events import StreamEvent
 from .manager import RedisManager
 
 
@@ -11,25 +12,37 @@ class RedisService:
         self.manager = manager
         logger.info("🔴 Redis сервис инициализирован")
 
-    async def publish(self, request_id, data) -> None:
-        """Публикует данные в канал."""
-        return await self.manager.publish(request_id, data)
+    async def publish(self, request_id, data, kind: bytes = StreamEvent.CHUNK) -> None:
+        """Публикует событие в стрим ответа."""
+        return await self.manager.publish(request_id, data, kind)
 
     async def publish_chunk(self, request_id, chunk: str) -> None:
         """Публикует чанк в Redis канал."""
         return await self.manager.publish_chunk(request_id, chunk)
 
+    def stream_writer(self, request_id):
+        """Пишет дельты ответа в стрим пачками."""
+        return self.manager.stream_writer(request_id)
+
     async def publish_message_start(self, request_id, message_data: dict) -> None:
         """Публикует начало сообщения."""
         return await self.manager.publish_message_start(request_id, message_data)
 
+    async def publish_chat_title(self, request_id, title_data: dict) -> None:
+        """Публикует сгенерированное название чата."""
+        return await self.manager.publish_chat_title(request_id, title_data)
+
     async def publish_done(self, request_id, message_data: dict) -> None:
         """Публикует завершение сообщения."""
         return await self.manager.publish_done(request_id, message_data)
 
-    def subscribe_to_stream(self, request_id):
-        """Подписывается на стрим сообщений."""
-        return self.manager.subscribe_to_stream(request_id)
+    def subscribe_to_stream(self, request_id, last_id=None):
+        """Читает стрим сообщений (с места переподключения)."""
+        return self.manager.subscribe_to_stream(request_id, last_id)
+
+    async def has_stream(self, request_id) -> bool:
+        """Есть ли еще стрим ответа."""
+        return await self.manager.has_stream(request_id)
 
     async def get_result(self, request_id):
         """Получает результат обработки."""
@@ -39,10 +52,78 @@ class RedisService:
         """Сохраняет результат обработки."""
         return await self.manager.set_result(request_id, result)
 
+    async def wait_result(self, request_id, timeout: float):
+        """Ждет результат без опроса."""
+        return await self.manager.wait_result(request_id, timeout)
+
     async def set_error(self, request_id, message: str, status_code: int, is_stream: bool) -> None:
         """Отправляет ошибку клиенту."""
         return await self.manager.set_error(request_id, message, status_code, is_stream)
 
+    async def cancel(self, request_id) -> None:
+        """Отменяет запрос (клиент ушел или перестал ждать)."""
+        return await self.manager.cancel(request_id)
+
+    async def is_cancelled(self, request_id) -> bool:
+        """Проверяет, отменен ли запрос."""
+        return await self.manager.is_cancelled(request_id)
+
+    def listen_cancellations(self):
+        """Подписывается на отмены запросов."""
+        return self.manager.listen_cancellations()
+
+    async def reserve_keys(self, keys):
+        """Занимает ключи дедупликации, возвращает уже занятый ключ."""
+        return await self.manager.reserve_keys(keys)
+
+    async def resolve_key(self, key: str, wait: float = 5.0):
+        """Получает id запроса по ключу дедупликации."""
+        return await self.manager.resolve_key(key, wait)
+
+    async def bind_keys(self, keys, request_id) -> None:
+        """Привязывает ключи дедупликации к запросу."""
+        return await self.manager.bind_keys(keys, request_id)
+
+    async def release_keys(self, keys) -> None:
+        """Освобождает ключи дедупликации."""
+        return await self.manager.release_keys(keys)
+
+    async def attach(self, request_id) -> None:
+        """Регистрирует клиента, ждущего ответ."""
+        return await self.manager.attach(request_id)
+
+    async def detach(self, request_id) -> int:
+        """Снимает клиента, ждущего ответ."""
+        return await self.manager.detach(request_id)
+
+    async def watchers(self, request_id) -> int:
+        """Число клиентов, ждущих ответ."""
+        return await self.manager.watchers(request_id)
+
+    async def incr_stats(self, key: str, field: str, amount: int = 1) -> None:
+        """Увеличивает общий счетчик метрики."""
+        return await self.manager.incr_stats(key, field, amount)
+
+    async def get_stats(self, key: str):
+        """Счетчики метрики."""
+        return await self.manager.get_stats(key)
+
+    async def get_pool_config(self):
+        """Ручная настройка пула воркеров."""
+        return await self.manager.get_pool_config()
+
+    async def set_pool_config(self, config) -> None:
+        """Сохраняет ручную настройку пула воркеров."""
+        return await self.manager.set_pool_config(config)
+
+    async def report_pool_state(self, process_id: str, state, ttl: int) -> None:
+        """Публикует состояние пула процесса."""
+        return await self.manager.report_pool_state(process_id, state, ttl)
+
+    async def get_pool_states(self):
+        """Состояния пулов процессов-воркеров."""
+        return await self.manager.get_pool_states()
+
     async def close(self) -> None:
         """Закрывает соединение с Redis."""
         return await self.manager.close()
@@ -0,0 +1,29 @@
+# fmt: off
+# isort: off
+import orjson
+
+from typing import Any
+
+
+class StreamEvent:
+    """Тип события стрима — отдельное поле t записи: API узнает управляющие события, не разбирая тело."""
+
+    START = b"s"
+    CHUNK = b"c"
+    DONE = b"d"
+    ERROR = b"e"
+    TITLE = b"t"
+
+
+def dumps(data: Any) -> bytes:
+    """JSON в bytes (orjson: UTF-8 без экранирования, в разы быстрее json)."""
+    return orjson.dumps(data)
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data)
+
+
+def sse(event_id: bytes, data: bytes) -> bytes:
+    """SSE-кадр из готового JSON-тела, без декодирования."""
+    return b"id: " + event_id + b"\ndata: " + data + b"\n\n" if event_id else b"data: " + data + b"\n\n"
@@ -1,13 +1,23 @@
 # fmt: off
 # isort: off
-import json
+import asyncio
 
 from uuid import UUID
 from loguru import logger
 import redis.asyncio as redis
-from typing import Optional, AsyncGenerator, Union
+from typing import Any, Dict, List, Optional, AsyncGenerator, Tuple, Union
 
 from app.settings import SETTINGS
+from .events import StreamEvent, dumps, loads
+from .mux import StreamMux, stream_id
+from .writer import StreamWriter
+
+
+# Канал широковещательной отмены выполняющихся запросов
+CANCEL_CHANNEL = "cancel"
+
+# Значение ключа дедупликации, пока запрос еще не поставлен в очередь
+PENDING = b"pending"
 
 
 class RedisManager:
@@ -15,6 +25,7 @@ class RedisManager:
 
     def __init__(self):
         self._client: Optional[redis.Redis] = None
+        self._mux: Optional[StreamMux] = None
 
     @property
     async def client(self) -> redis.Redis:
@@ -24,70 +35,264 @@ class RedisManager:
         return self._client
 
 
-    async def publish(self, request_id: UUID, data: Union[str, dict]) -> None:
-        """Публикует данные в канал."""
-        payload = json.dumps(data, ensure_ascii=False) if isinstance(data, dict) else str(data)
-        await (await self.client).publish(f"stream:{request_id}", payload)
+    async def publish(self, request_id: UUID, data: Union[bytes, dict], kind: bytes = StreamEvent.CHUNK) -> None:
+        """Добавляет событие в Redis Stream ответа (ограниченный, с id для переподключений)."""
+        payload = data if isinstance(data, bytes) else dumps(data)
+        async with (await self.client).pipeline(transaction=False) as pipe:
+            pipe.xadd(f"stream:{request_id}", {"t": kind, "data": payload}, maxlen=SETTINGS.STREAM_MAXLEN, approximate=True)
+            pipe.expire(f"stream:{request_id}", SETTINGS.MAX_TIMEOUT)
+            await pipe.execute()
 
 
     async def publish_chunk(self, request_id: UUID, chunk: str) -> None:
-        await self.publish(request_id, json.dumps(chunk, ensure_ascii=False))
+        await self.publish(request_id, dumps(chunk), StreamEvent.CHUNK)
+
+
+    def stream_writer(self, request_id: UUID) -> StreamWriter:
+        """Буферизованная запись дельт ответа в стрим."""
+        return StreamWriter(self, request_id, SETTINGS.STREAM_FLUSH_INTERVAL, SETTINGS.STREAM_FLUSH_BYTES)
 
 
     async def publish_message_start(self, request_id: UUID, message_data: dict) -> None:
-        await self.publish(request_id, message_data)
+        await self.publish(request_id, message_data, StreamEvent.START)
+
+
+    async def publish_chat_title(self, request_id: UUID, title_data: dict) -> None:
+        await self.publish(request_id, title_data, StreamEvent.TITLE)
 
 
     async def publish_done(self, request_id: UUID, message_data: dict) -> None:
-        await self.publish(request_id, message_data)
-        await (await self.client).expire(f"stream:{request_id}", 120)
+        await self.publish(request_id, message_data, StreamEvent.DONE)
+        await (await self.client).expire(f"stream:{request_id}", SETTINGS.STREAM_TTL)
 
 
-    async def subscribe_to_stream(self, request_id: UUID) -> AsyncGenerator[str, None]:
-        """Подписывается на стрим."""
-        pubsub = (await self.client).pubsub()
+    async def has_stream(self, request_id: UUID) -> bool:
+        """Есть ли еще Redis Stream ответа."""
+        return bool(await (await self.client).exists(f"stream:{request_id}"))
+
+
+    async def _read_stream(self, key: str, last_id: str) -> AsyncGenerator[Tuple[bytes, bytes, bytes], None]:
+        """События стрима после last_id через общий на процесс reader (StreamMux)."""
         try:
-            await pubsub.subscribe(f"stream:{request_id}")
-            async for message in pubsub.listen():
-                if message["type"] != "message":
-                    continue
-                data = message["data"].decode("utf-8") if isinstance(message["data"], bytes) else str(message["data"])
-                yield f"data: {data}\n\n"
-                try:
-                    if json.loads(data).get("status") == "completed":
-                        break
-                except (json.JSONDecodeError, TypeError, AttributeError):
-                    pass
+            seen = stream_id(last_id)
+        except ValueError:
+            seen = (0, 0)
+        seen = (max(seen[0], 0), max(seen[1], 0))
+        if not self._mux:
+            self._mux = StreamMux(SETTINGS.STREAM_READ_BLOCK)
+        queue, cursor = self._mux.subscribe(key, f"{seen[0]}-{seen[1]}")
+        try:
+            # Стрим уже читается для другого клиента дальше нашей позиции — разрыв дочитываем сами
+            if stream_id(cursor) > seen:
+                for entry_id, fields in await (await self.client).xrange(key, f"({seen[0]}-{seen[1]}", cursor):
+                    seen = stream_id(entry_id)
+                    yield entry_id, fields.get(b"t", StreamEvent.CHUNK), fields[b"data"]
+            while True:
+                entry_id, kind, data = await queue.get()
+                if stream_id(entry_id) > seen:
+                    seen = stream_id(entry_id)
+                    yield entry_id, kind, data
+        finally:
+            self._mux.unsubscribe(key, queue)
+
+
+    async def subscribe_to_stream(
+        self, request_id: UUID, last_id: Optional[str] = None
+    ) -> AsyncGenerator[Tuple[Optional[bytes], bytes, bytes], None]:
+        """Читает стрим с начала или после last_id (Last-Event-ID): (id события, тип, JSON-тело)."""
+        events = self._read_stream(f"stream:{request_id}", last_id or "0")
+        try:
+            async for entry_id, kind, data in events:
+                yield entry_id, kind, data
+                if kind == StreamEvent.DONE:
+                    return
 
         except Exception as e:
             logger.error(f"Redis стрим ошибка: {e}")
-            yield f"data: {{\"error\": \"Stream error\"}}\n\n"
+            yield None, StreamEvent.ERROR, b'{"error": "Stream error"}'
 
         finally:
-            await pubsub.unsubscribe(f"stream:{request_id}")
-            await pubsub.close()
+            await events.aclose()
 
 
     async def get_result(self, request_id: UUID) -> Optional[dict]:
         """Получает результат."""
         if result := await (await self.client).get(f"result:{request_id}"):
-            return json.loads(result.decode("utf-8"))
+            return loads(result)
         return None
 
 
     async def set_result(self, request_id: UUID, result: dict) -> None:
-        """Сохраняет результат."""
-        await (await self.client).setex(f"result:{request_id}", 120, json.dumps(result, ensure_ascii=False))
+        """Сохраняет результат и будит ожидающих его клиентов."""
+        async with (await self.client).pipeline(transaction=True) as pipe:
+            pipe.setex(f"result:{request_id}", SETTINGS.RESULT_TTL, dumps(result))
+            pipe.xadd(f"done:{request_id}", {"t": StreamEvent.DONE, "data": b"1"}, maxlen=1)
+            pipe.expire(f"done:{request_id}", SETTINGS.RESULT_TTL)
+            await pipe.execute()
+
+
+    async def wait_result(self, request_id: UUID, timeout: float) -> Optional[dict]:
+        """Ждет сигнал готовности через общий reader, без опроса. None — таймаут."""
+        if (result := await self.get_result(request_id)) is not None:
+            return result
+        events = self._read_stream(f"done:{request_id}", "0")
+        try:
+            await asyncio.wait_for(anext(events), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            await events.aclose()
+        return await self.get_result(request_id)
 
 
     async def set_error(self, request_id: UUID, message: str, status_code: int, is_stream: bool) -> None:
         """Отправляет ошибку клиенту."""
         error_data = {"error": True, "message": message, "status_code": status_code}
-        await (self.publish if is_stream else self.set_result)(request_id, error_data)
+        if is_stream:
+            await self.publish(request_id, error_data, StreamEvent.ERROR)
+        else:
+            await self.set_result(request_id, error_data)
+
+
+    async def cancel(self, request_id: UUID) -> None:
+        """Сигнал отмены: флаг для еще не начатых запросов + broadcast для выполняющихся."""
+        client = await self.client
+        await client.setex(f"cancel:{request_id}", SETTINGS.MAX_TIMEOUT, 1)
+        await client.publish(CANCEL_CHANNEL, str(request_id))
+
+
+    async def is_cancelled(self, request_id: UUID) -> bool:
+        """Проверяет флаг отмены."""
+        return bool(await (await self.client).exists(f"cancel:{request_id}"))
+
+
+    async def listen_cancellations(self) -> AsyncGenerator[UUID, None]:
+        """Поток id отмененных запросов."""
+        pubsub = (await self.client).pubsub()
+        try:
+            await pubsub.subscribe(CANCEL_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield UUID(message["data"].decode("utf-8"))
+        finally:
+            await pubsub.unsubscribe(CANCEL_CHANNEL)
+            await pubsub.close()
+
+
+    async def reserve_keys(self, keys: Dict[str, int]) -> Optional[str]:
+        """Занимает ключи дедупликации {ключ: ttl} (SET NX). Возвращает уже занятый ключ или None."""
+        client = await self.client
+        reserved = []
+        for key, ttl in keys.items():
+            if not await client.set(key, PENDING, nx=True, ex=ttl):
+                if reserved:
+                    await client.delete(*reserved)
+                return key
+            reserved.append(key)
+        # Сигнал от прошлого владельца ключа не должен разбудить ожидающих нового
+        await client.delete(*(f"bound:{key}" for key in reserved))
+        return None
+
+
+    async def resolve_key(self, key: str, wait: float = 5.0) -> Optional[UUID]:
+        """id запроса по ключу дедупликации (ждет сигнала, что владелец поставил запрос в очередь или отказался)."""
+        client = await self.client
+        if (value := await client.get(key)) == PENDING:
+            events = self._read_stream(f"bound:{key}", "0")
+            try:
+                await asyncio.wait_for(anext(events), wait)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                await events.aclose()
+            value = await client.get(key)
+        return UUID(value.decode("utf-8")) if value and value != PENDING else None
+
+
+    @staticmethod
+    def _signal_keys(pipe, keys: List[str]) -> None:
+        """Будит ожидающих resolve_key: ключ привязан к запросу или освобожден."""
+        for key in keys:
+            pipe.xadd(f"bound:{key}", {"t": StreamEvent.DONE, "data": b"1"}, maxlen=1)
+            pipe.expire(f"bound:{key}", SETTINGS.MAX_TIMEOUT)
+
+
+    async def bind_keys(self, keys: List[str], request_id: UUID) -> None:
+        """Привязывает занятые ключи к поставленному запросу (TTL сохраняется)."""
+        async with (await self.client).pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, str(request_id), keepttl=True)
+            RedisManager._signal_keys(pipe, keys)
+            await pipe.execute()
+
+
+    async def release_keys(self, keys: List[str]) -> None:
+        """Освобождает ключи дедупликации."""
+        if keys:
+            async with (await self.client).pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                RedisManager._signal_keys(pipe, keys)
+                await pipe.execute()
+
+
+    async def attach(self, request_id: UUID) -> None:
+        """Клиент подключился к ожиданию ответа."""
+        client = await self.client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.incr(f"watchers:{request_id}")
+            pipe.expire(f"watchers:{request_id}", SETTINGS.MAX_TIMEOUT)
+            await pipe.execute()
+
+
+    async def detach(self, request_id: UUID) -> int:
+        """Клиент перестал ждать ответ, возвращает число оставшихся."""
+        return await (await self.client).decr(f"watchers:{request_id}")
+
+
+    async def watchers(self, request_id: UUID) -> int:
+        """Сколько клиентов ждут ответ."""
+        return int(await (await self.client).get(f"watchers:{request_id}") or 0)
+
+
+    async def incr_stats(self, key: str, field: str, amount: int = 1) -> None:
+        """Увеличивает счетчик метрики, общий для всех процессов."""
+        await (await self.client).hincrby(key, field, amount)
+
+
+    async def get_stats(self, key: str) -> Dict[str, int]:
+        """Счетчики метрики."""
+        return {k.decode("utf-8"): int(v) for k, v in (await (await self.client).hgetall(key)).items()}
+
+
+    async def get_pool_config(self) -> Dict[str, Any]:
+        """Ручная настройка пула воркеров, общая для всех процессов."""
+        if config := await (await self.client).get("pool:config"):
+            return loads(config)
+        return {}
+
+
+    async def set_pool_config(self, config: Dict[str, Any]) -> None:
+        await (await self.client).set("pool:config", dumps(config))
+
+
+    async def report_pool_state(self, process_id: str, state: Dict[str, Any], ttl: int) -> None:
+        """Публикует состояние пула процесса (исчезает вместе с процессом по TTL)."""
+        await (await self.client).setex(f"pool:state:{process_id}", ttl, dumps(state))
+
+
+    async def get_pool_states(self) -> List[Dict[str, Any]]:
+        """Состояния пулов живых процессов."""
+        client = await self.client
+        if not (keys := [key async for key in client.scan_iter(match="pool:state:*", count=100)]):
+            return []
+        return [loads(state) for state in await client.mget(keys) if state]
 
 
     async def close(self) -> None:
         """Закрывает соединение."""
+        if self._mux:
+            await self._mux.close()
+            self._mux = None
         if self._client:
             await self._client.close()
             self._client = None
@@ -0,0 +1,93 @@
+# fmt: off
+# isort: off
+import asyncio
+
+from loguru import logger
+import redis.asyncio as redis
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.settings import SETTINGS
+
+
+def stream_id(entry_id: Union[bytes, str]) -> Tuple[int, int]:
+    """id события стрима для сравнения: "1700000000000-3" -> (1700000000000, 3)."""
+    ms, _, seq = (entry_id.decode("ascii") if isinstance(entry_id, bytes) else entry_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+class _Key:
+    __slots__ = ("cursor", "queues")
+
+    def __init__(self, cursor: str):
+        self.cursor = cursor
+        self.queues: Set[asyncio.Queue] = set()
+
+
+class StreamMux:
+    """Одно соединение на процесс: общий XREAD BLOCK по всем читаемым стримам и раздача событий по очередям.
+
+    BLOCK короткий: новый стрим попадает в набор на следующем XREAD, без служебных записей в Redis.
+    """
+
+    def __init__(self, block_ms: int):
+        self._block_ms = block_ms
+        self._keys: Dict[str, _Key] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+
+    def subscribe(self, key: str, last_id: str) -> Tuple[asyncio.Queue, str]:
+        """Подписывает очередь на стрим после last_id. Возвращает очередь и позицию, с которой ее кормит
+        общий reader: события между last_id и этой позицией подписчик дочитывает сам (XRANGE)."""
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if not (entry := self._keys.get(key)):
+            entry = self._keys[key] = _Key(last_id)
+            self._changed.set()
+        entry.queues.add(queue := asyncio.Queue())
+        return queue, entry.cursor
+
+
+    def unsubscribe(self, key: str, queue: asyncio.Queue) -> None:
+        """Отписывает очередь; стрим без подписчиков перестает читаться."""
+        if (entry := self._keys.get(key)):
+            entry.queues.discard(queue)
+            if not entry.queues:
+                del self._keys[key]
+
+
+    async def _run(self) -> None:
+        reader = redis.from_url(SETTINGS.REDIS_URL, max_connections=1)
+        try:
+            while True:
+                if not self._keys:
+                    self._changed.clear()
+                    await self._changed.wait()
+                streams = {key: entry.cursor for key, entry in self._keys.items()}
+                # Любая ошибка — повтор: упавший reader оставил бы подписчиков навсегда ждать в queue.get()
+                try:
+                    for raw_key, entries in await reader.xread(streams, block=self._block_ms) or []:
+                        self._dispatch(raw_key.decode("utf-8"), entries)
+                except Exception as e:
+                    logger.warning(f"🔴 Общий reader стримов [{e.__class__.__name__}]: {e}, повтор через 1с")
+                    await asyncio.sleep(1)
+        finally:
+            await reader.close()
+
+
+    def _dispatch(self, key: str, entries: List) -> None:
+        if not (entry := self._keys.get(key)):
+            return
+        for entry_id, fields in entries:
+            entry.cursor = entry_id.decode("ascii")
+            event = (entry_id, fields.get(b"t", b"c"), fields[b"data"])
+            for queue in entry.queues:
+                queue.put_nowait(event)
+
+
+    async def close(self) -> None:
+        """Останавливает общий reader."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
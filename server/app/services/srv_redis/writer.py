@@ -0,0 +1,65 @@
+# fmt: off
+# isort: off
+import time
+import asyncio
+
+from uuid import UUID
+from typing import List, Optional
+
+
+class StreamWriter:
+    """Копит дельты ответа и пишет их в стрим пачкой: по окну времени или по размеру."""
+
+    def __init__(self, manager, request_id: UUID, interval: float, size: int):
+        self._manager = manager
+        self._request_id = request_id
+        self._interval = interval
+        self._size = size
+        self._buffer: List[str] = []
+        self._bytes = 0
+        self._started = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+
+    async def write(self, text: str) -> None:
+        """Добавляет дельту; сбрасывает буфер, если он переполнен или окно истекло."""
+        if not self._buffer:
+            self._started = time.monotonic()
+            if self._interval > 0:
+                self._timer = asyncio.create_task(self._flush_later())
+        self._buffer.append(text)
+        self._bytes += len(text)
+        if self._bytes >= self._size or time.monotonic() - self._started >= self._interval:
+            await self.flush()
+
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._interval)
+        self._timer = None
+        await self.flush()
+
+
+    async def flush(self) -> None:
+        """Пишет накопленное одним событием."""
+        if self._timer and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        text, self._buffer, self._bytes = "".join(self._buffer), [], 0
+        # Порядок событий сохраняется: Lock в asyncio выдается по очереди. Берем его и с пустым буфером —
+        # так flush дожидается уже идущей записи таймера, и DONE не обгоняет последний чанк
+        async with self._lock:
+            if text:
+                await self._manager.publish_chunk(self._request_id, text)
+
+
+    async def __aenter__(self) -> "StreamWriter":
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.flush()
+        elif self._timer:
+            self._timer.cancel()
+            self._timer = None
@@ -6,24 +6,30 @@ from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .manager import SubManager
+from .quota import QuotaManager
 from .objects import SubscriptionInfo, LimitsInfo
 
 
 class SubService:
     """Фасад сервиса подписок."""
 
-    def __init__(self, manager: Optional[SubManager] = None):
+    def __init__(self, manager: Optional[SubManager] = None, quota: Optional[QuotaManager] = None):
         """Инициализация сервиса подписок."""
         self._manager = manager or SubManager()
+        self._quota = quota or QuotaManager()
         logger.info("🍿 SubService инициализирован")
 
     async def get_user_subscription(self, db: AsyncSession, user_id: UUID) -> Optional[SubscriptionInfo]:
         """Получает подписку пользователя."""
-        return await self._manager.get_user_subscription(db, user_id)
+        if (info := await self._manager.get_user_subscription(db, user_id)) and (used := await self._quota.used(user_id)) is not None:
+            info.req_used = used
+        return info
 
     async def get_user_limits(self, db: AsyncSession, user_id: UUID) -> Optional[LimitsInfo]:
-        """Получает лимиты пользователя."""
-        return await self._manager.get_user_limits(db, user_id)
+        """Получает лимиты пользователя (req_used — с еще не записанными в БД списаниями)."""
+        if (limits := await self._manager.get_user_limits(db, user_id)) and (used := await self._quota.used(user_id)) is not None:
+            limits.req_used, limits.req_remaining = used, max(0, limits.req_max - used)
+        return limits
 
     async def off_auto_renewal(self, db: AsyncSession, user_id: UUID) -> bool:
         """Отменяет автопродление подписки (сбрасывает payment_id)."""
@@ -33,4 +39,33 @@ class SubService:
         self, db: AsyncSession, user_id: UUID, tariff_id: UUID, payment_method_id: str = None
     ) -> Optional[SubscriptionInfo]:
         """Обновляет подписку пользователя."""
-        return await self._manager.update_subscription(db, user_id, tariff_id, payment_method_id)
+        info = await self._manager.update_subscription(db, user_id, tariff_id, payment_method_id)
+        await self._quota.drop([user_id])
+        return info
+
+    async def reserve_quota(self, db: AsyncSession, user_id: UUID, token: str) -> bool:
+        """Резервирует запрос из квоты пользователя."""
+        return await self._quota.reserve(db, user_id, token)
+
+    async def commit_quota(self, user_id: UUID, token: Optional[str]) -> bool:
+        """Списывает резерв; False — списывать в БД."""
+        return await self._quota.commit(user_id, token)
+
+    async def release_quota(self, user_id: UUID, token: Optional[str]) -> None:
+        """Возвращает резерв невыполненного запроса."""
+        return await self._quota.release(user_id, token)
+
+    async def drop_quota_cache(self, user_ids=None) -> int:
+        """Сбрасывает кэш лимитов."""
+        return await self._quota.drop(user_ids)
+
+    async def reset_usage(self, reset_db) -> int:
+        """Сбрасывает счетчики периода в кэше и БД (reset_db) без гонки с записью счетчиков."""
+        return await self._quota.reset(reset_db)
+
+    async def flush_usage(self, batch: int) -> int:
+        """Пишет накопленные req_used в БД."""
+        return await self._quota.flush(batch)
+
+    async def close(self) -> None:
+        await self._quota.close()
@@ -0,0 +1,196 @@
+# fmt: off
+# isort: off
+import time
+
+from uuid import UUID
+from loguru import logger
+import redis.asyncio as redis
+from typing import Awaitable, Callable, Iterable, Optional
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.storage import Subscription, get_session
+from app.settings import SETTINGS
+
+
+# Множество пользователей, чей req_used в Redis еще не записан в subscriptions
+DIRTY_KEY = "quota:dirty"
+
+# Блокировка между записью счетчиков в БД и сбросом периода; флаг — идет сброс периода
+LOCK_KEY = "quota:lock"
+RESET_KEY = "quota:reset"
+
+# KEYS: лимиты, резервы. ARGV: токен, now, ttl резерва. -1 — лимитов нет в кэше, 0 — лимит исчерпан
+_RESERVE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[2])
+local max = tonumber(redis.call('HGET', KEYS[1], 'max'))
+local used = tonumber(redis.call('HGET', KEYS[1], 'used'))
+if max < 0 or (max > 0 and used + redis.call('ZCARD', KEYS[2]) >= max) then return 0 end
+redis.call('ZADD', KEYS[2], tonumber(ARGV[2]) + tonumber(ARGV[3]), ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# KEYS: лимиты. Обнуляет счетчик нового периода только у существующего ключа (иначе хэш остался бы без max)
+_RESET = """
+if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('HSET', KEYS[1], 'used', 0) end
+"""
+
+# KEYS: лимиты, резервы, dirty. ARGV: токен, user_id. Ключ лимитов не истекает, пока счетчик не сброшен в БД
+_COMMIT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+redis.call('HINCRBY', KEYS[1], 'used', 1)
+redis.call('PERSIST', KEYS[1])
+redis.call('SADD', KEYS[3], ARGV[2])
+return 1
+"""
+
+
+class QuotaManager:
+    """Квоты запросов в Redis: атомарный резерв/списание (Lua) и отложенная запись req_used в subscriptions."""
+
+    def __init__(self):
+        self._client: Optional[redis.Redis] = None
+        self._reserve = None
+        self._commit = None
+        self._reset = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if not self._client:
+            self._client = redis.from_url(SETTINGS.REDIS_URL)
+            self._reserve = self._client.register_script(_RESERVE)
+            self._commit = self._client.register_script(_COMMIT)
+            self._reset = self._client.register_script(_RESET)
+        return self._client
+
+
+    @staticmethod
+    def _keys(user_id: UUID) -> list:
+        return [f"quota:u:{user_id}", f"quota:r:{user_id}"]
+
+
+    async def _load(self, db: AsyncSession, user_id: UUID) -> None:
+        """Заполняет кэш лимитов из активной подписки (max -1 — подписки нет)."""
+        sub = await db.scalar(select(Subscription).where(Subscription.user_id == user_id, Subscription.active == True))
+        # Во время сброса периода req_used в БД может быть еще старым — новый период начинается с нуля
+        used = 0 if not sub or await self.client.exists(RESET_KEY) else sub.req_used
+        key = f"quota:u:{user_id}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, "max", sub.req_max if sub else -1)
+            pipe.hsetnx(key, "used", used)
+            pipe.expire(key, SETTINGS.QUOTA_CACHE_TTL, nx=True)
+            await pipe.execute()
+
+
+    async def reserve(self, db: AsyncSession, user_id: UUID, token: str) -> bool:
+        """Резервирует один запрос из квоты. False — лимит исчерпан или подписка неактивна."""
+        client, args = self.client, [token, time.time(), SETTINGS.QUOTA_RESERVE_TTL]
+        if (result := await self._reserve(keys=self._keys(user_id), args=args, client=client)) == -1:
+            await self._load(db, user_id)
+            result = await self._reserve(keys=self._keys(user_id), args=args, client=client)
+        return result == 1
+
+
+    async def commit(self, user_id: UUID, token: Optional[str]) -> bool:
+        """Списывает резерв в req_used. False — лимитов нет в кэше, списывать нужно в БД."""
+        client, keys = self.client, [*self._keys(user_id), DIRTY_KEY]
+        return await self._commit(keys=keys, args=[token or "", str(user_id)], client=client) == 1
+
+
+    async def release(self, user_id: UUID, token: Optional[str]) -> None:
+        """Возвращает резерв в квоту (запрос не выполнен)."""
+        if token:
+            await self.client.zrem(f"quota:r:{user_id}", token)
+
+
+    async def used(self, user_id: UUID) -> Optional[int]:
+        """req_used из кэша (свежее БД до ближайшего сброса)."""
+        value = await self.client.hget(f"quota:u:{user_id}", "used")
+        return int(value) if value is not None else None
+
+
+    async def drop(self, user_ids: Optional[Iterable[UUID]] = None) -> int:
+        """Сбрасывает кэш лимитов (после изменения подписки в БД). None — для всех пользователей."""
+        if user_ids is not None:
+            keys = [f"quota:u:{user_id}" for user_id in user_ids]
+        else:
+            keys = [key async for key in self.client.scan_iter(match="quota:u:*", count=1000)]
+        if not keys:
+            return 0
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(*keys)
+            if user_ids is None:
+                pipe.delete(DIRTY_KEY)
+            else:
+                pipe.srem(DIRTY_KEY, *[str(user_id) for user_id in user_ids])
+            return (await pipe.execute())[0]
+
+
+    async def reset(self, reset_db: Callable[[], Awaitable[int]]) -> int:
+        """Новый период: обнуляет счетчики в кэше, затем в БД (reset_db), под блокировкой записи счетчиков.
+
+        Кэш сбрасывается первым и остается источником правды: списания после сброса копятся в нем (dirty) и
+        запишутся в БД после reset_db, а запись старых значений поверх сброшенной БД невозможна — flush ждет.
+        """
+        client = self.client
+        async with client.lock(LOCK_KEY, timeout=300, blocking_timeout=300):
+            await client.set(RESET_KEY, 1, ex=300)
+            try:
+                async for key in client.scan_iter(match="quota:u:*", count=1000):
+                    await self._reset(keys=[key], client=client)
+                return await reset_db()
+            finally:
+                await client.delete(RESET_KEY)
+
+
+    async def flush(self, batch: int) -> int:
+        """Пишет накопленные req_used в subscriptions одним UPDATE (executemany). Возвращает число снятых из dirty."""
+        lock = self.client.lock(LOCK_KEY, timeout=60, blocking=False)
+        if not await lock.acquire():
+            return 0  # Идет сброс периода — запишем на следующем запуске
+        try:
+            return await self._flush(batch)
+        finally:
+            await lock.release()
+
+
+    async def _flush(self, batch: int) -> int:
+        if not (user_ids := await self.client.spop(DIRTY_KEY, batch)):
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hget(f"quota:u:{user_id.decode('utf-8')}", "used")
+            values = await pipe.execute()
+        rows = [
+            {"uid": UUID(user_id.decode("utf-8")), "used": int(used)}
+            for user_id, used in zip(user_ids, values) if used is not None
+        ]
+        try:
+            if rows:
+                table = Subscription.__table__
+                async for db in get_session():
+                    await db.execute(
+                        update(table).where(table.c.user_id == bindparam("uid"), table.c.active == True)
+                        .values(req_used=bindparam("used")),
+                        rows
+                    )
+                    await db.commit()
+        except Exception:
+            # Вернем пользователей в очередь на запись — счетчики остаются в Redis
+            await self.client.sadd(DIRTY_KEY, *user_ids)
+            raise
+        # Записанный счетчик снова может истечь из кэша
+        async with self.client.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.expire(f"quota:u:{row['uid']}", SETTINGS.QUOTA_CACHE_TTL)
+            await pipe.execute()
+        return len(user_ids)
+
+
+    async def close(self) -> None:
+        if self._client:
+            await self._client.close()
+            self._client = None
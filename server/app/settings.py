@@ -1,6 +1,6 @@
 # fmt: off
 # isort: off
-from typing import Optional
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
 
@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     # === API ===
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8080
+    APP_ROLE: str = "all"  # api | worker | scheduler | all
 
     PROXY_HTTP: str
 
@@ -24,6 +25,7 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379"
 
     JWT_SECRET: str = "123"
+    ADMIN_TOKEN: Optional[str] = None
 
     YOOKASSA_SECRET_KEY: str
     YOOKASSA_SHOP_ID: str
@@ -33,6 +35,54 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     OPENAI_API_URL: str
     MAX_TIMEOUT: int = 300
+    RESULT_TTL: int = 600  # Сколько хранится готовый ответ (для повторов клиента)
+    IDEMPOTENCY_TTL: int = 600  # Сколько живет Idempotency-Key -> запрос
+    DEDUP_WINDOW: int = 0  # Окно дедупликации по (пользователь, чат, текст) для запросов без Idempotency-Key, 0 — выключено
+    CANCEL_GRACE: float = 10.0  # Сколько ждать переподключения клиента перед отменой
+    STREAM_MAXLEN: int = 10000  # Предел событий в Redis Stream одного ответа
+    STREAM_TTL: int = 120  # Сколько хранится стрим после завершения (для переподключений)
+    STREAM_FLUSH_INTERVAL: float = 0.05  # Окно склейки дельт в одно событие, 0 — без склейки
+    STREAM_FLUSH_BYTES: int = 512  # Сброс буфера дельт раньше окна при таком размере
+    STREAM_READ_BLOCK: int = 100  # BLOCK общего XREAD, мс: не дольше этого новый стрим ждет, пока его начнут читать
+
+    # === NEURO ===
+    NEURO_INLINE_TOOLS: bool = False  # Тулы в стриме финального ответа вместо отдельного прохода
+    NEURO_MAX_TOOL_ROUNDS: int = 3  # Сколько раз модель может вызвать тулы за один ответ
+    NEURO_SPECULATE: List[str] = ["PREMIUM"]  # Приоритеты, для которых ответ генерируется параллельно с проходом тулов
+    NEURO_INTENT_MODE: str = "shadow"  # off | shadow (только метрики) | on (пропуск прохода тулов по классификатору)
+    NEURO_INTENT_THRESHOLD: float = 0.2  # Ниже этой вероятности вызова тула проход тулов пропускается
+    NEURO_INTENT_MODEL: str = ""  # JSON с весами классификатора интентов (benchmarks/intent_bench.py)
+    NEURO_INTENT_LOG: str = ""  # JSONL-журнал решений роутера для обучения классификатора
+
+    # === QUOTA ===
+    QUOTA_CACHE_TTL: int = 3600  # Сколько лимиты пользователя живут в Redis после записи в БД
+    QUOTA_RESERVE_TTL: int = 900  # Резерв незавершенного запроса (с учетом повторов) возвращается в квоту
+    QUOTA_FLUSH_INTERVAL: int = 10  # Период записи req_used из Redis в subscriptions
+    QUOTA_FLUSH_BATCH: int = 1000
+
+    # === QUEUE ===
+    QUEUE_BACKEND: str = "postgres"  # postgres | redis | memory
+    QUEUE_PROCESSES: int = 1  # Процессов с воркерами очереди (у каждого свой пул)
+    QUEUE_BATCH: int = 100
+    QUEUE_PREFETCH: int = 10  # Запросов в локальной очереди сверх свободных воркеров
+    QUEUE_WORKERS: int = 50
+    QUEUE_WORKERS_MIN: int = 5
+    QUEUE_WORKERS_MAX: int = 200
+    QUEUE_AUTOSCALE_INTERVAL: float = 5.0
+    QUEUE_AUTOSCALE_ERROR_RATIO: float = 0.5
+    QUEUE_AUTOSCALE_THROTTLE_RATIO: float = 0.1
+    QUEUE_FALLBACK_POLL: float = 10.0
+    QUEUE_BUSY_POLL: float = 0.1
+    QUEUE_STATS_TTL: float = 2.0
+    QUEUE_LEASE_TIMEOUT: int = 60
+    QUEUE_LEASE_HEARTBEAT: float = 15.0
+    QUEUE_MAX_ATTEMPTS: int = 3
+    QUEUE_RETRY_BASE: float = 1.0
+    QUEUE_RETRY_MAX_DELAY: float = 60.0
+    QUEUE_ACK_INTERVAL: float = 0.05
+    QUEUE_ACK_BATCH: int = 100
+    QUEUE_USER_MAX_INFLIGHT: int = 3
+    QUEUE_CLAIM_POOL: int = 4  # Во сколько раз пул заблокированных кандидатов больше пачки (справедливый выбор внутри пула)
 
     LOG_SERVICE_NAME: str = "hack-t-bank"
     LOG_LEVEL: str = "INFO"
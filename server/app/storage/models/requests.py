@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, TYPE_CHECKING
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import JSON, DateTime, ForeignKey, Text, delete
+from sqlalchemy import JSON, DateTime, ForeignKey, Text, Integer, delete
 
 from ..enums import RequestStatus, RequestPriority
 from .base import Base
@@ -25,6 +25,8 @@ class Request(Base):
     locked_at:    Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), index=True)
     processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     error:        Mapped[Optional[str]]      = mapped_column(Text)
+    attempts:     Mapped[int]                = mapped_column(Integer, default=0, server_default="0", nullable=False, doc="Сколько раз запрос захватывался воркером")
+    available_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), doc="Не раньше этого времени (отложенный повтор)")
 
     # Отношения
     user: Mapped["User"] = relationship(back_populates="requests")
@@ -0,0 +1,72 @@
+# fmt: off
+# isort: off
+"""Обучение и офлайн-оценка классификатора интентов на журнале решений роутера (NEURO_INTENT_LOG).
+
+Делит журнал на train/test, обучает IntentClassifier и печатает по порогам долю пропущенных проходов тулов,
+потерянные и сохраненные (kept) вызовы тулов и вызовы провайдера на сообщение (роутер + ответ):
+
+    uv run python -m benchmarks.intent_bench --log logs/intent.jsonl --out intent_model.json
+    uv run python -m benchmarks.intent_bench --log logs/intent.jsonl --thresholds 0.05,0.1,0.2,0.3
+"""
+import random
+import argparse
+import orjson
+
+from pathlib import Path
+from typing import List, Tuple
+
+from app.services.srv_neuro.toolcalls.intent import IntentClassifier
+
+
+def load(path: str) -> List[Tuple[str, bool]]:
+    samples = []
+    for line in Path(path).read_bytes().splitlines():
+        if line.strip():
+            entry = orjson.loads(line)
+            samples.append((entry["text"], bool(entry["tools"])))
+    return samples
+
+
+def report(model: IntentClassifier, test: List[Tuple[str, bool]], thresholds: List[float]) -> None:
+    scores = [(model.predict(text), called) for text, called in test]
+    n, positives = len(scores) or 1, sum(1 for _, called in scores if called)
+    print(f"\ntest={len(scores)} с тулами={positives} ({positives / n:.1%}) признаков={len(model.weights)}")
+    print(f"  {'threshold':>9} {'skip':>7} {'missed':>7} {'kept':>7} {'calls/msg':>9}")
+    for threshold in thresholds:
+        skipped = [called for score, called in scores if score < threshold]
+        missed = sum(skipped)
+        lost = missed / positives if positives else 0.0
+        # Без гейта — 2 вызова на сообщение (роутер + ответ), пропуск снимает вызов роутера
+        calls = 2 - len(skipped) / n
+        print(f"  {threshold:>9.2f} {len(skipped) / n:>7.1%} {missed / n:>7.2%} {1 - lost:>7.1%} {calls:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.intent_bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--log", required=True, help="JSONL-журнал решений роутера")
+    parser.add_argument("--out", default="", help="Куда сохранить обученную модель (NEURO_INTENT_MODEL)")
+    parser.add_argument("--test-share", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--lr", type=float, default=0.1)
+    parser.add_argument("--thresholds", default="0.05,0.1,0.2,0.3,0.5")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples = load(args.log)
+    random.Random(args.seed).shuffle(samples)
+    split = int(len(samples) * (1 - args.test_share))
+
+    model = IntentClassifier()
+    model.fit(samples[:split], epochs=args.epochs, lr=args.lr)
+    report(model, samples[split:], [float(t) for t in args.thresholds.split(",")])
+
+    if args.out:
+        # Финальная модель — на всем журнале
+        model = IntentClassifier()
+        model.fit(samples, epochs=args.epochs, lr=args.lr)
+        model.save(args.out)
+        print(f"\nмодель сохранена в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
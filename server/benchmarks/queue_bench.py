@@ -0,0 +1,215 @@
+# fmt: off
+# isort: off
+"""Бенчмарк QueueManager: пропускная способность, ожидание в очереди, round trip'ы и справедливость.
+
+Синтетический обработчик (задержка из распределения + доля ошибок) крутит настоящий
+process_queue поверх выбранного бэкенда:
+
+    uv run python -m benchmarks.queue_bench --backend memory --requests 5000 --workers 50 --batch 100
+    uv run python -m benchmarks.queue_bench --backend postgres --users 20 --latency lognormal:0.05:0.5 --rate 200
+
+Для postgres нужны существующие пользователи (FK requests.user_id) — берутся первые --users из users.
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+from uuid import UUID, uuid4
+from loguru import logger
+from sqlalchemy import event, select
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Tuple
+
+from app.storage import RequestPriority, User, engine, get_session
+from app.services.srv_queue.backends import QueueBackend, get_backend
+from app.services.srv_queue.manager import QueueManager
+from app.services.srv_queue.objects import Job
+
+
+# Методы бэкенда, вызов которых — обращение к хранилищу во время обработки
+_ROUND_TRIPS = ("claim", "count", "ack", "renew", "release_expired")
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """const:<s> | uniform:<min>:<max> | exp:<mean> | lognormal:<median>:<sigma>."""
+    kind, *params = spec.split(":")
+    p = [float(x) for x in params]
+    if kind == "const":     return lambda: p[0]
+    if kind == "uniform":   return lambda: random.uniform(p[0], p[1])
+    if kind == "exp":       return lambda: random.expovariate(1 / p[0])
+    if kind == "lognormal": return lambda: p[0] * random.lognormvariate(0, p[1])
+    raise argparse.ArgumentTypeError(f"Неизвестное распределение задержки: {spec}")
+
+
+def parse_ratio(spec: str) -> Tuple[int, int]:
+    general, premium = spec.split(":")
+    return int(general), int(premium)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def count_calls(backend: QueueBackend, calls: Counter) -> None:
+    """Оборачивает методы бэкенда счетчиком вызовов (до создания менеджера — AckBuffer берет ack сразу)."""
+    for name in _ROUND_TRIPS:
+        method = getattr(backend, name)
+
+        async def wrapped(*args, _method=method, _name=name, **kwargs):
+            calls[_name] += 1
+            return await _method(*args, **kwargs)
+        setattr(backend, name, wrapped)
+
+
+class Recorder:
+    """Собирает метрики из синтетического обработчика."""
+
+    def __init__(self, total: int, latency: Callable[[], float], fail_rate: float):
+        self.total = total
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.enqueued: Dict[UUID, float] = {}
+        self.waits: Dict[RequestPriority, List[float]] = defaultdict(list)
+        self.order: List[RequestPriority] = []
+        self.failed: List[UUID] = []
+        self.finished = asyncio.Event()
+        self.processed = 0
+
+
+    async def handler(self, req: Job) -> bool:
+        """Синтетический обработчик."""
+        self.waits[req.priority].append(time.perf_counter() - self.enqueued.get(req.id, time.perf_counter()))
+        self.order.append(req.priority)
+        try:
+            await asyncio.sleep(self.latency())
+            if random.random() < self.fail_rate:
+                self.failed.append(req.id)
+                raise RuntimeError("synthetic failure")
+            return True
+        finally:
+            self.processed += 1
+            if self.processed >= self.total:
+                self.finished.set()
+
+
+async def load_users(args: argparse.Namespace) -> List[UUID]:
+    if args.backend != "postgres":
+        return [uuid4() for _ in range(args.users)]
+    async for db in get_session():
+        if not (users := list((await db.execute(select(User.id).limit(args.users))).scalars().all())):
+            raise SystemExit("В таблице users нет пользователей для запросов бенчмарка")
+        return users
+    return []
+
+
+async def produce(manager: QueueManager, rec: Recorder, users: List[UUID], args: argparse.Namespace) -> None:
+    """Кладет --requests запросов: все сразу (--rate 0) или с постоянной интенсивностью."""
+    async def put(db) -> None:
+        started = time.perf_counter()
+        for i in range(args.requests):
+            priority = RequestPriority.PREMIUM if random.random() < args.premium_share else RequestPriority.GENERAL
+            req_id = await manager.enqueue(db, random.choice(users), {"type": "bench", "n": i}, priority)
+            rec.enqueued[req_id] = time.perf_counter()
+            # Темп по расписанию, а не sleep(1/rate): иначе упираемся в гранулярность таймера
+            if args.rate > 0 and (lag := started + (i + 1) / args.rate - time.perf_counter()) > 0:
+                await asyncio.sleep(lag)
+
+    if args.backend != "postgres":
+        return await put(None)
+    async for db in get_session():
+        await put(db)
+
+
+def fairness(order: List[RequestPriority], ratio: Tuple[int, int]) -> Tuple[float, float]:
+    """Доля premium, пока в очереди были оба приоритета, и ожидаемая по ratio."""
+    remaining = Counter(order)
+    both = []
+    for priority in order:
+        if not remaining[RequestPriority.GENERAL] or not remaining[RequestPriority.PREMIUM]:
+            break
+        both.append(priority)
+        remaining[priority] -= 1
+    share = sum(1 for p in both if p == RequestPriority.PREMIUM) / len(both) if both else 0.0
+    return share, ratio[1] / sum(ratio)
+
+
+def report(rec: Recorder, calls: Counter, statements: int, elapsed: float, args: argparse.Namespace) -> None:
+    n = rec.processed or 1
+    print(f"\nbackend={args.backend} workers={args.workers} batch={args.batch} ratio={args.ratio[0]}:{args.ratio[1]} "
+          f"latency={args.latency} fail_rate={args.fail_rate} rate={args.rate or 'burst'}")
+    print(f"  processed      {rec.processed} за {elapsed:.2f}s -> {rec.processed / elapsed:.1f} req/s, failed={len(rec.failed)}")
+
+    for priority in RequestPriority:
+        waits = [w * 1000 for w in rec.waits[priority]]
+        if waits:
+            print(f"  wait {priority.value:<9} n={len(waits):<6} mean={sum(waits) / len(waits):8.1f}ms  "
+                  f"p50={percentile(waits, 50):8.1f}ms  p95={percentile(waits, 95):8.1f}ms  p99={percentile(waits, 99):8.1f}ms")
+
+    share, expected = fairness(rec.order, args.ratio)
+    print(f"  fairness       premium share {share:.2%} (ratio -> {expected:.2%}) пока оба приоритета в очереди")
+    print(f"  round trips    {sum(calls.values()) / n:.3f} вызовов бэкенда/запрос "
+          + " ".join(f"{name}={calls[name]}" for name in _ROUND_TRIPS))
+    if args.backend == "postgres":
+        print(f"  sql            {statements / n:.3f} SQL-выражений/запрос ({statements} всего)")
+
+
+async def bench(args: argparse.Namespace) -> None:
+    backend, calls = get_backend(args.backend), Counter()
+    count_calls(backend, calls)
+
+    manager = QueueManager(ratio=args.ratio, workers=args.workers, batch=args.batch, backend=backend)
+    manager.configure_pool(workers=args.workers)  # Фиксированный пул: автоскейлер не мешает сравнению
+    rec = Recorder(args.requests, parse_latency(args.latency), args.fail_rate)
+    users = await load_users(args)
+
+    statements = 0
+    def on_execute(*_) -> None:
+        nonlocal statements
+        statements += 1
+    if args.backend == "postgres":
+        event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+
+    started = time.perf_counter()
+    runner = asyncio.create_task(manager.process_queue(rec.handler))
+    await produce(manager, rec, users, args)
+    await rec.finished.wait()
+    elapsed = time.perf_counter() - started
+
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    if args.backend == "postgres":
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+    if rec.failed:
+        await backend.purge_dead(rec.failed)
+
+    report(rec, calls, statements, elapsed, args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.queue_bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="memory", choices=("memory", "postgres", "redis"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--ratio", type=parse_ratio, default=(1, 2), help="general:premium")
+    parser.add_argument("--premium-share", type=float, default=0.3, help="Доля premium среди входящих")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", default="lognormal:0.05:0.5", help="Распределение задержки обработчика")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=0.0, help="Запросов/с на входе (0 — все сразу)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    parse_latency(args.latency)
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
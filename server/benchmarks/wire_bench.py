@@ -0,0 +1,82 @@
+# fmt: off
+# isort: off
+"""Микробенчмарк формата событий стрима: json-текст с разбором каждого события против типа в поле + orjson.
+
+Считает CPU на событие для обеих сторон — воркер (кодирование дельты) и API (маршрутизация + SSE-кадр):
+
+    uv run python -m benchmarks.wire_bench --events 200000 --chunk 24
+"""
+import json
+import time
+import random
+import string
+import argparse
+
+from typing import Callable, List, Tuple
+
+from app.services.srv_redis.events import StreamEvent, dumps, sse
+
+
+def make_chunks(n: int, size: int) -> List[str]:
+    alphabet = string.ascii_letters + "абвгдежзийклмнопрстуфхцчшщыэюя ,.\n"
+    return ["".join(random.choices(alphabet, k=size)) for _ in range(n)]
+
+
+def legacy(chunks: List[str]) -> int:
+    """Было: json.dumps на воркере; на API decode + json.loads в subscribe_to_stream и еще раз в chat_stream."""
+    sent = 0
+    for chunk in chunks:
+        wire = json.dumps(chunk, ensure_ascii=False).encode("utf-8")        # воркер -> Redis
+        data = wire.decode("utf-8")                                         # Redis -> API
+        try:
+            if json.loads(data).get("status") == "completed":
+                break
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            pass
+        frame = f"data: {data}\n\n"
+        try:
+            if json.loads(frame.replace("data: ", "").strip()).get("error"):
+                break
+        except Exception:
+            pass
+        sent += len(frame.encode("utf-8"))                                  # Starlette кодирует str
+    return sent
+
+
+def framed(chunks: List[str]) -> int:
+    """Стало: orjson на воркере; API смотрит только тип события и склеивает bytes."""
+    sent, event_id = 0, b"1700000000000-0"
+    for chunk in chunks:
+        kind, wire = StreamEvent.CHUNK, dumps(chunk)
+        if kind == StreamEvent.DONE or kind == StreamEvent.ERROR:
+            break
+        sent += len(sse(event_id, wire))
+    return sent
+
+
+def measure(fn: Callable[[List[str]], int], chunks: List[str], repeat: int) -> Tuple[float, int]:
+    best, sent = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        sent = fn(chunks)
+        best = min(best, time.perf_counter() - started)
+    return best, sent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.wire_bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=24, help="Символов в дельте (после склейки — больше)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.events, args.chunk)
+    old, _ = measure(legacy, chunks, args.repeat)
+    new, _ = measure(framed, chunks, args.repeat)
+    print(f"\nevents={args.events} chunk={args.chunk} символов, лучший из {args.repeat}")
+    print(f"  json + разбор   {old / args.events * 1e9:8.0f} ns/событие")
+    print(f"  тип + orjson    {new / args.events * 1e9:8.0f} ns/событие  -> x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
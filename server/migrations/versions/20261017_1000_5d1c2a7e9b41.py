@@ -0,0 +1,32 @@
+"""requests: счетчик попыток для аренды запросов
+
+Revision ID: 5d1c2a7e9b41
+Revises: 0382eff2632d
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1c2a7e9b41'
+down_revision: str | None = '0382eff2632d'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('requests', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('requests', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
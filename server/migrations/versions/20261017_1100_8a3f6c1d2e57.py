@@ -0,0 +1,32 @@
+"""requests: отложенный повтор запросов
+
+Revision ID: 8a3f6c1d2e57
+Revises: 5d1c2a7e9b41
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a3f6c1d2e57'
+down_revision: str | None = '5d1c2a7e9b41'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('requests', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('requests', schema=None) as batch_op:
+        batch_op.drop_column('available_at')